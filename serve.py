@@ -5,13 +5,19 @@ Provides /ask endpoint for question-answering using vector database.
 """
 
 import os
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import List, Dict, Optional
 from dotenv import load_dotenv
+import orjson
+import tiktoken
+from cachetools import TTLCache
 
 from fastapi import FastAPI, HTTPException, Depends, Request, Query, Cookie
-from fastapi.responses import FileResponse, RedirectResponse, JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, RedirectResponse, JSONResponse, ORJSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
@@ -19,6 +25,8 @@ from pydantic import BaseModel
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain_chroma import Chroma
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import SystemMessage, HumanMessage
 from chromadb import HttpClient
 from chromadb.errors import ChromaError
 import time
@@ -66,10 +74,19 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run service initialization before the app starts accepting requests."""
+    await startup_event()
+    yield
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="RAG Chatbot API",
     version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,  # orjson is much faster than stdlib json for answer payloads
     docs_url="/docs" if not IS_PRODUCTION else None,  # Disable docs in production
     redoc_url="/redoc" if not IS_PRODUCTION else None  # Disable redoc in production
 )
@@ -79,6 +96,12 @@ WEB_DIR = Path(__file__).parent / "web"
 if WEB_DIR.exists():
     app.mount("/web", StaticFiles(directory=str(WEB_DIR)), name="web")
 
+# Chat page is static - resolve and load it once instead of stat/read per request
+CHAT_HTML_PATH = WEB_DIR / "chat.html"
+CHAT_HTML_BYTES = CHAT_HTML_PATH.read_bytes() if CHAT_HTML_PATH.exists() else None
+# private: the page sits behind auth, so shared caches must not store it
+CHAT_HTML_HEADERS = {"Cache-Control": "private, max-age=300"}
+
 # Enable CORS for web frontend - Production: restrict to allowed origins
 app.add_middleware(
     CORSMiddleware,
@@ -89,9 +112,129 @@ app.add_middleware(
     expose_headers=["X-Redirect-To"],
 )
 
+# Validated tokens: raw JWT -> (user_id, exp). Entries are also checked against exp on read.
+TOKEN_CACHE = TTLCache(maxsize=10_000, ttl=60)
+
 # Global variables for vector store and LLM
 vectorstore = None
+embeddings = None
+search_by_vector = None
 llm = None
+token_encoding = None
+
+# Chat model and context token budget - excerpts are clipped before going to the LLM
+LLM_MODEL = "gpt-4o-mini"  # Can change to "gpt-4" or "gpt-3.5-turbo"
+MAX_EXCERPT_TOKENS = 500
+MAX_CONTEXT_TOKENS = 3000
+
+# Number of chunks retrieved per question
+# Increased from 8 to 10 to reduce chance of missing relevant information
+RETRIEVAL_K = 10
+
+# Metadata fields checked (in order) for a document's source filename
+FILENAME_METADATA_KEYS = ('filename', 'file_source', 'original_file', 'source')
+
+# Prompts - built once at import time, never change between requests
+SYSTEM_PROMPT_TEXT = """You are Pye, the content creator and photography mentor from SLR Lounge. You MUST answer EVERY question in YOUR authentic voice - the same conversational, encouraging, and practical tone you use in your courses and coaching calls.
+
+CRITICAL ACCURACY REQUIREMENTS - STRICT ADHERENCE TO CONTEXT:
+- ONLY use information provided in the context snippets - DO NOT use your training knowledge
+- If information is not in the context, say "I don't have that specific information in my materials" 
+- DO NOT make up definitions, acronyms, or explanations
+- Quote directly from the context when providing definitions
+- If you're unsure, acknowledge uncertainty rather than guessing
+
+CRITICAL VOICE REQUIREMENTS:
+- Speak directly to the student as if you're having a one-on-one conversation
+- Use YOUR natural speaking style - conversational, encouraging, practical
+- Be authentic and genuine - this is YOUR voice, not a generic assistant
+- Use phrases like "Let's talk about...", "Here's the thing...", "What I want you to understand is..."
+- Be encouraging and supportive - you're a mentor, not just an information source
+- Share insights from YOUR experience and expertise ONLY when supported by the context
+- Keep it real and relatable - no corporate speak or formal language
+
+REQUIRED FORMAT:
+## 💡 THE CONCEPT
+[explanation in YOUR voice]
+
+## 🎯 WHY THIS MATTERS
+[explanation in YOUR voice]
+
+## ✅ ACTION STEPS
+- Step 1
+- Step 2
+
+You MUST use this exact structure with emojis in headers AND answer in YOUR authentic Pye voice. Do not write paragraphs without headers. Do not use a generic or formal tone - always be YOU."""
+
+SYSTEM_MSG = SystemMessage(content=SYSTEM_PROMPT_TEXT)
+
+# User prompt template - filled with .format(context=..., question=...) per request
+USER_PROMPT_TEMPLATE = """You are Pye, the content creator and photography mentor from SLR Lounge. Answer in YOUR authentic voice - the same conversational, encouraging, and practical tone you use in your courses and coaching calls. Speak directly to the student as if you're having a one-on-one conversation.
+
+CRITICAL ACCURACY REQUIREMENTS - YOU MUST FOLLOW THESE STRICTLY:
+1. ONLY use information from the provided context snippets below - DO NOT use your training knowledge or general knowledge
+2. If the answer is not in the provided context, say "I don't have that information in my training materials" or ask for clarification
+3. DO NOT make up definitions, acronyms, or explanations that aren't explicitly stated in the context
+4. Quote directly from the context when providing definitions or explanations
+5. If you see conflicting information in the context, acknowledge it and use the most specific/recent information
+6. NEVER guess or infer meanings that aren't clearly stated in the context
+
+Context snippets (each includes the original source name):
+{context}
+
+CRITICAL FORMATTING REQUIREMENTS - YOU MUST FOLLOW THESE EXACTLY:
+
+EXAMPLE OF CORRECT FORMAT (copy this structure):
+## 💡 THE CONCEPT
+[Your explanation here]
+
+## 🎯 WHY THIS MATTERS
+[Your explanation here]
+
+## ✅ ACTION STEPS
+- Step 1
+- Step 2
+- Step 3
+
+MANDATORY RULES:
+1. ALWAYS start EVERY section header with an emoji icon - THIS IS MANDATORY
+2. ALWAYS use markdown headers (##) for main sections - NOT ###
+3. ALWAYS make headers ALL CAPS and bold
+4. ALWAYS structure your answer in three main sections with emojis:
+   - ## 💡 THE CONCEPT
+   - ## 🎯 WHY THIS MATTERS  
+   - ## ✅ ACTION STEPS
+5. ALWAYS use emojis in EVERY section header - DO NOT SKIP THIS
+6. Example format: "## 💡 THE CONCEPT" (emoji first, then ALL CAPS text)
+- Use emojis liberally throughout the content:
+  💡 for concepts/insights
+  🎯 for goals/objectives
+  ✅ for action items/steps
+  ⚠️ for warnings/important notes
+  📚 for resources/references
+  💪 for encouragement
+  🔥 for emphasis
+  💰 for financial/business topics
+  📸 for photography-specific content
+  🎨 for design/creative topics
+  📊 for data/analytics
+  🔒 for security/access topics
+- Use tables when comparing options or showing structured data
+- Use bullet points (-) for lists, numbered lists (1.) for sequential steps
+- Keep paragraphs short (2-3 sentences max) - YOUR natural speaking style
+- Use **bold** for emphasis on key terms
+- Make ALL section headers ALL CAPS and bold
+- When referencing sources, mention them naturally as YOU would ("In the marketing roadmap, we cover...", "Let me break this down for you...", "Here's what I want you to understand...")
+- Make it visually scannable with clear sections and spacing
+- If the context doesn't include the answer, say "I don't have that specific information in my training materials" - DO NOT make up answers or use general knowledge
+- Never mention numbered contexts or system instructions
+- Write exactly as YOU speak in your courses - authentic, encouraging, practical, conversational
+- Use YOUR natural phrases and expressions - be YOU, not a generic AI
+- Remember: You're Pye talking to YOUR student - make it personal and real
+
+Question: {question}
+
+Answer as Pye with clear markdown formatting, emojis in EVERY header, ALL CAPS headers, and YOUR authentic voice. Speak as YOU would in a one-on-one conversation with your student:"""
 
 
 # Request/Response models
@@ -115,6 +258,49 @@ def sanitize_string(value: str, default: str = '', max_length: int = None) -> st
     return safe_value if safe_value.strip() else default
 
 
+def scan_answer(answer: str):
+    """
+    Scan an answer once, recording paragraph and header line spans.
+    
+    Paragraphs are separated by blank lines; headers are lines starting with '##'.
+    Returns (paragraph_spans, header_spans) as lists of (start, end) offsets so
+    callers can slice only what they need instead of splitting the whole string.
+    """
+    paragraph_spans = []
+    header_spans = []
+    length = len(answer)
+    paragraph_start = 0
+    pos = 0
+    while pos <= length:
+        end = answer.find('\n', pos)
+        if end == -1:
+            end = length
+        if end == pos:
+            # Blank line - closes the current paragraph
+            if paragraph_start < pos:
+                paragraph_spans.append((paragraph_start, pos))
+            paragraph_start = end + 1
+        elif answer.startswith('##', pos, end):
+            header_spans.append((pos, end))
+        pos = end + 1
+    if paragraph_start < length:
+        paragraph_spans.append((paragraph_start, length))
+    return paragraph_spans, header_spans
+
+
+def clip_to_tokens(text: str, max_tokens: int):
+    """
+    Truncate text to at most max_tokens tokens, dropping from the end.
+    Returns (clipped_text, token_count).
+    """
+    if max_tokens <= 0 or not text:
+        return '', 0
+    token_ids = token_encoding.encode(text)
+    if len(token_ids) <= max_tokens:
+        return text, len(token_ids)
+    return token_encoding.decode(token_ids[:max_tokens]), max_tokens
+
+
 class SourceCitation(BaseModel):
     filename: str
     type: str
@@ -127,6 +313,83 @@ class AnswerResponse(BaseModel):
     sources: List[SourceCitation]
 
 
+class CoalescingEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that coalesces concurrent async query embeddings.
+    
+    Each aembed_query call is queued; a background task collects queries that
+    arrive within max_wait_ms of each other (up to max_batch) and sends them to
+    the underlying model as a single aembed_documents request, so concurrent
+    /ask requests share one OpenAI round trip. Sync calls pass straight through.
+    """
+    
+    def __init__(self, underlying: Embeddings, max_wait_ms: float = 5.0, max_batch: int = 64):
+        self.underlying = underlying
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._in_flight: set = set()  # Batch tasks - referenced so they are not garbage collected
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.underlying.embed_documents(texts)
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self.underlying.embed_query(text)
+    
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.underlying.aembed_documents(texts)
+    
+    async def aembed_query(self, text: str) -> List[float]:
+        # Start the batching task lazily so it binds to the running event loop
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run_batches())
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+    
+    async def _run_batches(self):
+        """Drain the queue into batches, each embedded in its own task.
+        The collector never waits on OpenAI, so a query arriving while a batch
+        is in flight starts its own request after max_wait instead of queueing
+        behind that round trip.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            task = asyncio.create_task(self._embed_batch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+    
+    async def _embed_batch(self, batch: list):
+        """Embed one batch with a single request and resolve each caller's future."""
+        try:
+            vectors = await self.underlying.aembed_documents([text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        if len(batch) > 1:
+            logger.debug(f"Coalesced {len(batch)} query embeddings into one request")
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+
 def get_openai_api_key() -> str:
     """Get OpenAI API key from environment."""
     api_key = os.getenv('OPENAI_API_KEY')
@@ -201,11 +464,11 @@ def initialize_vectorstore():
     Initialize ChromaDB vector store.
     STRICTLY uses remote ChromaDB HttpClient - NEVER local storage.
     """
-    global vectorstore
+    global vectorstore, embeddings, search_by_vector
     
     try:
-        # Initialize embeddings
-        embeddings = OpenAIEmbeddings(openai_api_key=get_openai_api_key())
+        # Initialize embeddings - concurrent /ask queries are batched into one request
+        embeddings = CoalescingEmbeddings(OpenAIEmbeddings(openai_api_key=get_openai_api_key()))
         
         # Connect to remote ChromaDB with retry logic
         logger.info(f"Connecting to remote ChromaDB at {CHROMA_HOST}:{CHROMA_PORT}")
@@ -236,6 +499,9 @@ def initialize_vectorstore():
         if vectorstore is None:
             raise RuntimeError("Vector store initialization failed - vectorstore is None")
         
+        # Bind the scored vector search once so /ask doesn't resolve it per request
+        search_by_vector = vectorstore.similarity_search_by_vector_with_relevance_scores
+        
         logger.info(f"✓ Vector store initialized and ready (collection: {COLLECTION_NAME})")
             
     except Exception as e:
@@ -246,12 +512,14 @@ def initialize_vectorstore():
 
 
 def initialize_llm():
-    """Initialize OpenAI chat model."""
-    global llm
+    """Initialize OpenAI chat model and its tokenizer."""
+    global llm, token_encoding
     
     try:
+        # May download the BPE file on first use, so load it under the startup retries
+        token_encoding = tiktoken.encoding_for_model(LLM_MODEL)
         llm = ChatOpenAI(
-            model_name="gpt-4o-mini",  # Can change to "gpt-4" or "gpt-3.5-turbo"
+            model_name=LLM_MODEL,
             temperature=0.3,  # Lower temperature to reduce hallucinations and increase accuracy
             openai_api_key=get_openai_api_key()
         )
@@ -289,20 +557,13 @@ async def verify_token(
         print("⚠️  WARNING: ENABLE_AUTH=true but AUTH_SECRET_KEY not set")
         return None
     
-    # Try to get token from various sources
-    auth_token_value = None
-    
-    # 1. Check query parameter
-    if token:
-        auth_token_value = token
-    
-    # 2. Check Authorization header
+    # Try to get token from various sources, in order:
+    # 1. Query parameter, 2. Authorization header (Bearer), 3. Cookie
+    auth_token_value = token
     if not auth_token_value:
         auth_header = request.headers.get('Authorization', '')
         if auth_header.startswith('Bearer '):
-            auth_token_value = auth_header.replace('Bearer ', '')
-    
-    # 3. Check cookie
+            auth_token_value = auth_header[7:]  # Slice off "Bearer " - no replace() scan/copy
     if not auth_token_value:
         auth_token_value = request.cookies.get('auth_token')
     
@@ -314,12 +575,20 @@ async def verify_token(
             headers={"X-Redirect-To": KJ_LOGIN_URL}
         )
     
+    # Same browser session resends the same token - skip JWT verification on a hit
+    cached = TOKEN_CACHE.get(auth_token_value)
+    if cached and cached[1] > time.time():
+        return cached[0]
+    
     try:
         # Validate token
         payload = validate_token(auth_token_value)
-        return payload.get('user_id')
+        user_id = payload.get('user_id')
+        TOKEN_CACHE[auth_token_value] = (user_id, payload.get('exp', 0))
+        return user_id
     except ValueError as e:
-        # Invalid or expired token - return 401
+        # Invalid or expired token - drop any cached entry and return 401
+        TOKEN_CACHE.pop(auth_token_value, None)
         raise HTTPException(
             status_code=401,
             detail=f"Invalid or expired token: {str(e)}",
@@ -327,11 +596,8 @@ async def verify_token(
         )
 
 
-@app.on_event("startup")
 async def startup_event():
     """Initialize services on startup."""
-    import time
-    
     logger.info("=" * 60)
     logger.info("Initializing RAG Chatbot API...")
     logger.info(f"Environment: {ENVIRONMENT}")
@@ -347,8 +613,11 @@ async def startup_event():
     for attempt in range(max_retries):
         try:
             logger.info(f"Attempting to initialize services (attempt {attempt + 1}/{max_retries})...")
-            initialize_vectorstore()
-            initialize_llm()
+            # Sync langchain inits are independent - run them concurrently off the event loop
+            await asyncio.gather(
+                run_in_threadpool(initialize_vectorstore),
+                run_in_threadpool(initialize_llm)
+            )
             logger.info("✓ API ready!")
             return
         except Exception as e:
@@ -359,7 +628,7 @@ async def startup_event():
             
             if attempt < max_retries - 1:
                 logger.info(f"Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
+                await asyncio.sleep(retry_delay)
             else:
                 logger.error("✗ All startup attempts failed. Service will not start.")
                 logger.error("=" * 60)
@@ -374,21 +643,29 @@ async def startup_event():
                 raise RuntimeError(f"Startup failed after {max_retries} attempts: {e}")
 
 
-@app.get("/health")
+# Pre-serialized healthy body - /health is polled constantly, so don't rebuild it per hit
+HEALTHY_BODY = orjson.dumps({
+    "status": "healthy",
+    "vectorstore_initialized": True,
+    "llm_initialized": True,
+    "environment": ENVIRONMENT
+})
+
+
+@app.get("/health", include_in_schema=False)
 async def health_check():
     """Health check endpoint for Render and monitoring."""
+    if vectorstore is not None and llm is not None:
+        return Response(content=HEALTHY_BODY, media_type="application/json")
+    
     status = {
-        "status": "healthy",
+        "status": "degraded",
         "vectorstore_initialized": vectorstore is not None,
         "llm_initialized": llm is not None,
-        "environment": ENVIRONMENT
+        "environment": ENVIRONMENT,
+        "message": "Services not fully initialized"
     }
-    
-    if vectorstore is None or llm is None:
-        status["status"] = "degraded"
-        status["message"] = "Services not fully initialized"
-    
-    return JSONResponse(content=status, status_code=200 if status["status"] == "healthy" else 503)
+    return ORJSONResponse(content=status, status_code=503)
 
 
 @app.get("/")
@@ -398,9 +675,8 @@ async def root(token: Optional[str] = Depends(verify_token)):
     
     If authentication is enabled, verifies token before serving the page.
     """
-    chat_file = WEB_DIR / "chat.html"
-    if chat_file.exists():
-        return FileResponse(str(chat_file))
+    if CHAT_HTML_BYTES is not None:
+        return Response(content=CHAT_HTML_BYTES, media_type="text/html", headers=CHAT_HTML_HEADERS)
     return {
         "status": "ok",
         "message": "RAG Chatbot API is running",
@@ -419,14 +695,11 @@ async def serve_chat_html(token: Optional[str] = Depends(verify_token)):
     This endpoint is used when accessing the chatbot directly.
     Token can be provided as query parameter: /web/chat.html?token=...
     """
-    chat_file = WEB_DIR / "chat.html"
-    
-    # Log for debugging
-    logger.info(f"Attempting to serve chat.html from: {chat_file}")
-    logger.info(f"WEB_DIR exists: {WEB_DIR.exists()}")
-    logger.info(f"chat_file exists: {chat_file.exists()}")
-    
-    if not chat_file.exists():
+    if CHAT_HTML_BYTES is None:
+        chat_file = CHAT_HTML_PATH
+        logger.info(f"chat.html not loaded at startup from: {chat_file}")
+        logger.info(f"WEB_DIR exists: {WEB_DIR.exists()}")
+        
         # Try alternative paths
         alt_paths = [
             Path("/app/web/chat.html"),  # Docker container path
@@ -445,7 +718,7 @@ async def serve_chat_html(token: Optional[str] = Depends(verify_token)):
         logger.error(f"__file__ location: {__file__}")
         raise HTTPException(status_code=404, detail=f"Chat page not found. Looked in: {chat_file}")
     
-    return FileResponse(str(chat_file))
+    return Response(content=CHAT_HTML_BYTES, media_type="text/html", headers=CHAT_HTML_HEADERS)
 
 
 @app.get("/auth/check")
@@ -515,11 +788,13 @@ async def generate_token_for_user(
         )
 
 
-@app.post("/ask", response_model=AnswerResponse)
+# response_model=None: the response is built from already-sanitized fields, so skip
+# FastAPI's re-validation pass; `responses` keeps the schema in the OpenAPI docs
+@app.post("/ask", response_model=None, responses={200: {"model": AnswerResponse}})
 async def ask_question(
     request: QuestionRequest,
     user_id: Optional[str] = Depends(verify_token)
-):
+) -> AnswerResponse:
     """
     Answer a question using RAG (Retrieval Augmented Generation).
     
@@ -557,15 +832,18 @@ async def ask_question(
                 logger.debug(f"Expanded query for acronym: {expanded_query}")
                 break
         
-        # Retrieve top 10 relevant chunks for better context coverage
-        # Increased from 8 to 10 to reduce chance of missing relevant information
-        docs_with_scores = vectorstore.similarity_search_with_score(
-            expanded_query,
-            k=10
+        # Retrieve top RETRIEVAL_K relevant chunks for better context coverage
+        # Embed through the coalescer so concurrent requests share one API call
+        query_embedding = await embeddings.aembed_query(expanded_query)
+        # Chroma's HTTP query is blocking - run it off the event loop
+        docs_with_scores = await run_in_threadpool(
+            search_by_vector,
+            query_embedding,
+            RETRIEVAL_K
         )
         
         if not docs_with_scores:
-            return AnswerResponse(
+            return AnswerResponse.model_construct(
                 answer="I couldn't find any relevant information to answer your question in my training materials.",
                 sources=[]
             )
@@ -585,13 +863,17 @@ async def ask_question(
         
         docs_with_scores = filtered_docs[:10]  # Limit to top 10 most relevant
         
-        # Format context from retrieved chunks
-        context_parts = []
-        sources = []
+        # Format context from retrieved chunks - preallocate, one slot per document
+        n = len(docs_with_scores)
+        context_parts = [None] * n
+        sources = [None] * n
+        used = 0  # Slots filled - only documents whose excerpt reached the prompt
+        context_tokens_left = MAX_CONTEXT_TOKENS
  
         for i, (doc, score) in enumerate(docs_with_scores, 1):
             content = doc.page_content
             metadata = doc.metadata if hasattr(doc, 'metadata') and doc.metadata else {}
+            get_meta = metadata.get  # Bind once - reused for every field lookup below
             
             # Debug logging (only in development) - log first document's metadata
             if not IS_PRODUCTION and i == 1:
@@ -601,8 +883,8 @@ async def ask_question(
             # Extract filename from multiple possible metadata fields
             # Handle both None and empty string cases
             filename = None
-            for key in ['filename', 'file_source', 'original_file', 'source']:
-                value = metadata.get(key) if metadata else None
+            for key in FILENAME_METADATA_KEYS:
+                value = get_meta(key)
                 if value and isinstance(value, str) and value.strip():
                     filename = value.strip()
                     break
@@ -644,16 +926,13 @@ async def ask_question(
             
             # Extract type from metadata
             doc_type = None
-            if metadata:
-                type_value = metadata.get('type')
-                if type_value and isinstance(type_value, str) and type_value.strip():
-                    doc_type = type_value.strip().lower()
+            type_value = get_meta('type')
+            if type_value and isinstance(type_value, str) and type_value.strip():
+                doc_type = type_value.strip().lower()
             
             # If no type found, infer from filename or source
             if not doc_type:
-                source_str = ''
-                if metadata:
-                    source_str = str(metadata.get('source', '')).lower()
+                source_str = str(get_meta('source', '')).lower()
                 filename_lower = filename.lower() if filename else ''
                 
                 if 'transcript' in filename_lower or 'transcript' in source_str:
@@ -669,10 +948,13 @@ async def ask_question(
             if not doc_type:
                 doc_type = 'document'
 
-            # Add to context for the LLM
-            context_parts.append(
-                f"Source: {filename}\nExcerpt:\n{content}\n---"
-            )
+            # Add to context for the LLM, clipped to the per-excerpt and total token budgets.
+            # A document left out of the prompt must not be cited either
+            excerpt, excerpt_tokens = clip_to_tokens(content, min(MAX_EXCERPT_TOKENS, context_tokens_left))
+            if not excerpt:
+                continue
+            context_parts[used] = f"Source: {filename}\nExcerpt:\n{excerpt}\n---"
+            context_tokens_left -= excerpt_tokens
  
             # Prepare source citation - ensure all fields are valid and sanitized
             # Sanitize filename
@@ -690,7 +972,12 @@ async def ask_question(
             )
             
             # Sanitize content (truncate to reasonable length)
-            content_preview = str(content[:200] + "..." if len(content) > 200 else content) if content else "No content available"
+            if not content:
+                content_preview = "No content available"
+            elif len(content) <= 200:
+                content_preview = content
+            else:
+                content_preview = content[:200] + "..."
             safe_content = sanitize_string(
                 content_preview,
                 default='No content available',
@@ -706,131 +993,26 @@ async def ask_question(
                 safe_score = 1.0
             
             # Create citation with sanitized fields
-            try:
-                sources.append(SourceCitation(
-                    filename=safe_filename,
-                    type=safe_type,
-                    content=safe_content,
-                    score=safe_score
-                ))
-            except Exception as e:
-                logger.warning(f"Failed to create SourceCitation: {e}, using defaults")
-                # Fallback to safe defaults
-                sources.append(SourceCitation(
-                    filename='document',
-                    type='document',
-                    content='Content unavailable',
-                    score=1.0
-                ))
+            # Fields are already sanitized above, so skip Pydantic validation
+            sources[used] = SourceCitation.model_construct(
+                filename=safe_filename,
+                type=safe_type,
+                content=safe_content,
+                score=safe_score
+            )
+            used += 1
  
+        # Documents past the token budget were skipped - drop their unused slots
+        del context_parts[used:], sources[used:]
         context = "\n\n".join(context_parts)
  
-        # Create prompt with context and question
-        prompt = f"""You are Pye, the content creator and photography mentor from SLR Lounge. Answer in YOUR authentic voice - the same conversational, encouraging, and practical tone you use in your courses and coaching calls. Speak directly to the student as if you're having a one-on-one conversation.
-
-CRITICAL ACCURACY REQUIREMENTS - YOU MUST FOLLOW THESE STRICTLY:
-1. ONLY use information from the provided context snippets below - DO NOT use your training knowledge or general knowledge
-2. If the answer is not in the provided context, say "I don't have that information in my training materials" or ask for clarification
-3. DO NOT make up definitions, acronyms, or explanations that aren't explicitly stated in the context
-4. Quote directly from the context when providing definitions or explanations
-5. If you see conflicting information in the context, acknowledge it and use the most specific/recent information
-6. NEVER guess or infer meanings that aren't clearly stated in the context
-
-Context snippets (each includes the original source name):
-{context}
-
-CRITICAL FORMATTING REQUIREMENTS - YOU MUST FOLLOW THESE EXACTLY:
-
-EXAMPLE OF CORRECT FORMAT (copy this structure):
-## 💡 THE CONCEPT
-[Your explanation here]
-
-## 🎯 WHY THIS MATTERS
-[Your explanation here]
-
-## ✅ ACTION STEPS
-- Step 1
-- Step 2
-- Step 3
-
-MANDATORY RULES:
-1. ALWAYS start EVERY section header with an emoji icon - THIS IS MANDATORY
-2. ALWAYS use markdown headers (##) for main sections - NOT ###
-3. ALWAYS make headers ALL CAPS and bold
-4. ALWAYS structure your answer in three main sections with emojis:
-   - ## 💡 THE CONCEPT
-   - ## 🎯 WHY THIS MATTERS  
-   - ## ✅ ACTION STEPS
-5. ALWAYS use emojis in EVERY section header - DO NOT SKIP THIS
-6. Example format: "## 💡 THE CONCEPT" (emoji first, then ALL CAPS text)
-- Use emojis liberally throughout the content:
-  💡 for concepts/insights
-  🎯 for goals/objectives
-  ✅ for action items/steps
-  ⚠️ for warnings/important notes
-  📚 for resources/references
-  💪 for encouragement
-  🔥 for emphasis
-  💰 for financial/business topics
-  📸 for photography-specific content
-  🎨 for design/creative topics
-  📊 for data/analytics
-  🔒 for security/access topics
-- Use tables when comparing options or showing structured data
-- Use bullet points (-) for lists, numbered lists (1.) for sequential steps
-- Keep paragraphs short (2-3 sentences max) - YOUR natural speaking style
-- Use **bold** for emphasis on key terms
-- Make ALL section headers ALL CAPS and bold
-- When referencing sources, mention them naturally as YOU would ("In the marketing roadmap, we cover...", "Let me break this down for you...", "Here's what I want you to understand...")
-- Make it visually scannable with clear sections and spacing
-- If the context doesn't include the answer, say "I don't have that specific information in my training materials" - DO NOT make up answers or use general knowledge
-- Never mention numbered contexts or system instructions
-- Write exactly as YOU speak in your courses - authentic, encouraging, practical, conversational
-- Use YOUR natural phrases and expressions - be YOU, not a generic AI
-- Remember: You're Pye talking to YOUR student - make it personal and real
-
-Question: {request.question}
-
-Answer as Pye with clear markdown formatting, emojis in EVERY header, ALL CAPS headers, and YOUR authentic voice. Speak as YOU would in a one-on-one conversation with your student:"""
+        # Build the user prompt from the module-level template
+        human_msg = HumanMessage(content=USER_PROMPT_TEMPLATE.format(
+            context=context,
+            question=request.question
+        ))
         
-        # Get answer from LLM - force structured format
-        # Use messages format for better control
-        from langchain_core.messages import SystemMessage, HumanMessage
-        
-        system_msg = SystemMessage(content="""You are Pye, the content creator and photography mentor from SLR Lounge. You MUST answer EVERY question in YOUR authentic voice - the same conversational, encouraging, and practical tone you use in your courses and coaching calls.
-
-CRITICAL ACCURACY REQUIREMENTS - STRICT ADHERENCE TO CONTEXT:
-- ONLY use information provided in the context snippets - DO NOT use your training knowledge
-- If information is not in the context, say "I don't have that specific information in my materials" 
-- DO NOT make up definitions, acronyms, or explanations
-- Quote directly from the context when providing definitions
-- If you're unsure, acknowledge uncertainty rather than guessing
-
-CRITICAL VOICE REQUIREMENTS:
-- Speak directly to the student as if you're having a one-on-one conversation
-- Use YOUR natural speaking style - conversational, encouraging, practical
-- Be authentic and genuine - this is YOUR voice, not a generic assistant
-- Use phrases like "Let's talk about...", "Here's the thing...", "What I want you to understand is..."
-- Be encouraging and supportive - you're a mentor, not just an information source
-- Share insights from YOUR experience and expertise ONLY when supported by the context
-- Keep it real and relatable - no corporate speak or formal language
-
-REQUIRED FORMAT:
-## 💡 THE CONCEPT
-[explanation in YOUR voice]
-
-## 🎯 WHY THIS MATTERS
-[explanation in YOUR voice]
-
-## ✅ ACTION STEPS
-- Step 1
-- Step 2
-
-You MUST use this exact structure with emojis in headers AND answer in YOUR authentic Pye voice. Do not write paragraphs without headers. Do not use a generic or formal tone - always be YOU.""")
-        
-        human_msg = HumanMessage(content=prompt)
-        
-        response = llm.invoke([system_msg, human_msg])
+        response = await llm.ainvoke([SYSTEM_MSG, human_msg])
         answer = response.content if hasattr(response, 'content') else str(response)
         
         # Post-process to ensure emojis and structure - ALWAYS enforce format
@@ -842,7 +1024,8 @@ You MUST use this exact structure with emojis in headers AND answer in YOUR auth
         if not has_headers or not has_emojis:
             # Force add structure - wrap existing content in proper format
             # Split content into paragraphs
-            paragraphs = [p.strip() for p in answer.split('\n\n') if p.strip()]
+            paragraph_spans, _ = scan_answer(answer)
+            paragraphs = [p for p in (answer[start:end].strip() for start, end in paragraph_spans) if p]
             
             # Create structured response with emojis
             structured_answer = "## 💡 THE CONCEPT\n\n"
@@ -889,28 +1072,30 @@ You MUST use this exact structure with emojis in headers AND answer in YOUR auth
             
             answer = structured_answer
         elif "##" in answer and not any(emoji in answer for emoji in ['💡', '🎯', '✅', '⚠️', '📚', '💰', '📸']):
-            # Add emojis to existing headers
-            lines = answer.split('\n')
-            processed_lines = []
-            header_count = 0
-            for line in lines:
-                if line.startswith('##'):
-                    header_count += 1
-                    line_lower = line.lower()
-                    if header_count == 1 or 'concept' in line_lower or 'what' in line_lower or 'overview' in line_lower:
-                        line = '## 💡 THE CONCEPT' if not line.startswith('## 💡') else line
-                        if not line.startswith('## 💡'):
-                            line = line.replace('##', '## 💡', 1)
-                    elif header_count == 2 or 'why' in line_lower or 'matter' in line_lower or 'important' in line_lower:
-                        line = '## 🎯 WHY THIS MATTERS' if not line.startswith('## 🎯') else line
-                        if not line.startswith('## 🎯'):
-                            line = line.replace('##', '## 🎯', 1)
-                    elif header_count >= 3 or 'step' in line_lower or 'action' in line_lower or 'how' in line_lower:
-                        line = '## ✅ ACTION STEPS' if not line.startswith('## ✅') else line
-                        if not line.startswith('## ✅'):
-                            line = line.replace('##', '## ✅', 1)
-                processed_lines.append(line)
-            answer = '\n'.join(processed_lines)
+            # Add emojis to existing headers - only header lines are sliced and rewritten
+            _, header_spans = scan_answer(answer)
+            processed_parts = []
+            last_end = 0
+            for header_count, (start, end) in enumerate(header_spans, 1):
+                line = answer[start:end]
+                line_lower = line.lower()
+                if header_count == 1 or 'concept' in line_lower or 'what' in line_lower or 'overview' in line_lower:
+                    line = '## 💡 THE CONCEPT' if not line.startswith('## 💡') else line
+                    if not line.startswith('## 💡'):
+                        line = line.replace('##', '## 💡', 1)
+                elif header_count == 2 or 'why' in line_lower or 'matter' in line_lower or 'important' in line_lower:
+                    line = '## 🎯 WHY THIS MATTERS' if not line.startswith('## 🎯') else line
+                    if not line.startswith('## 🎯'):
+                        line = line.replace('##', '## 🎯', 1)
+                elif header_count >= 3 or 'step' in line_lower or 'action' in line_lower or 'how' in line_lower:
+                    line = '## ✅ ACTION STEPS' if not line.startswith('## ✅') else line
+                    if not line.startswith('## ✅'):
+                        line = line.replace('##', '## ✅', 1)
+                processed_parts.append(answer[last_end:start])
+                processed_parts.append(line)
+                last_end = end
+            processed_parts.append(answer[last_end:])
+            answer = ''.join(processed_parts)
         
         # Validate and sanitize answer
         safe_answer = sanitize_string(
@@ -919,29 +1104,11 @@ You MUST use this exact structure with emojis in headers AND answer in YOUR auth
             max_length=10000  # Reasonable limit for answer length
         )
         
-        # Ensure sources list is valid
-        safe_sources = []
-        for source in sources:
-            try:
-                # Validate each source is properly formatted
-                safe_sources.append(source)
-            except Exception as e:
-                logger.warning(f"Invalid source citation, skipping: {e}")
-                continue
-        
-        try:
-            return AnswerResponse(
-                answer=safe_answer,
-                sources=safe_sources
-            )
-        except Exception as e:
-            logger.error(f"Failed to create AnswerResponse: {e}")
-            logger.error(f"Answer length: {len(safe_answer)}, Sources count: {len(safe_sources)}")
-            # Return minimal valid response
-            return AnswerResponse(
-                answer=safe_answer[:1000] if len(safe_answer) > 1000 else safe_answer,  # Truncate if too long
-                sources=safe_sources[:10] if len(safe_sources) > 10 else safe_sources  # Limit sources
-            )
+        # Answer and citations are sanitized above - construct without re-validating
+        return AnswerResponse.model_construct(
+            answer=safe_answer,
+            sources=sources
+        )
         
     except HTTPException:
         # Re-raise HTTP exceptions as-is
@@ -960,5 +1127,14 @@ You MUST use this exact structure with emojis in headers AND answer in YOUR auth
 if __name__ == "__main__":
     import uvicorn
     # Run on port 8001 to avoid conflict with ChromaDB (port 8000)
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    # Import string lets uvicorn fork workers; each worker initializes its own clients
+    # uvloop/httptools ship with uvicorn[standard]
+    uvicorn.run(
+        "serve:app",
+        host="0.0.0.0",
+        port=8001,
+        workers=int(os.getenv('WEB_CONCURRENCY', os.cpu_count() or 1)),
+        loop="uvloop",
+        http="httptools"
+    )
 
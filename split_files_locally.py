@@ -5,9 +5,13 @@ Splits transcript files into 0.01MB (10KB) segments before ingestion.
 Keeps files organized and named logically (e.g., sales_01.txt, sales_02.txt).
 """
 
+import logging
+import mmap
 import os
 import re
 import shutil
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 from typing import List, Tuple
 
@@ -15,6 +19,18 @@ from typing import List, Tuple
 TRANSCRIPTS_DIR = Path('10K2Kv2')
 MAX_SEGMENT_SIZE_BYTES = 10 * 1024  # 0.01MB = 10KB
 BACKUP_ORIGINALS = True  # Keep original files in a backup directory
+CWD = Path.cwd()  # Resolved once - used to print backup paths relative to it
+
+# All semantic boundaries in one pattern, coarsest first: paragraph, line,
+# sentence, clause. The group that matched gives the boundary's level.
+# Matched against UTF-8 bytes (mmap'd files) - multibyte sequences never contain
+# ASCII bytes, so boundaries can't land inside a character
+BOUNDARY_RE = re.compile(rb'(\n\s*\n)|(\n)|(?<=[.!?])([^\S\n]+)|(?<=[,;:])([^\S\n]+)')
+BOUNDARY_LEVELS = {1: 3, 2: 2, 3: 1, 4: 0}  # match.lastindex -> level (higher is coarser)
+END_OF_TEXT = -1
+COARSEST_FIRST_LEVELS = sorted(BOUNDARY_LEVELS.values(), reverse=True)
+
+logger = logging.getLogger(__name__)
 
 stats = {
     'files_processed': 0,
@@ -26,225 +42,309 @@ stats = {
 }
 
 
-def split_at_semantic_boundaries(content: str, target_size_bytes: int) -> List[str]:
-    """Split text at semantic boundaries (paragraphs, lines, sentences, clauses)."""
-    segments = []
-    paragraphs = content.split('\n\n')
-    current_segment = ""
-    current_size = 0
+def find_boundaries(content) -> Tuple[List[int], List[int], List[int]]:
+    """
+    Find every semantic boundary in one regex pass.
     
-    for para in paragraphs:
-        para_size = len(para.encode('utf-8'))
-        
-        # If paragraph itself is too large, split by lines
-        if para_size > target_size_bytes:
-            lines = para.split('\n')
-            for line in lines:
-                line_size = len(line.encode('utf-8'))
-                
-                # If line is too large, split by sentences
-                if line_size > target_size_bytes:
-                    sentences = re.split(r'(?<=[.!?])\s+', line)
-                    for sentence in sentences:
-                        sent_size = len(sentence.encode('utf-8'))
-                        
-                        # If sentence is too large, split by clauses
-                        if sent_size > target_size_bytes:
-                            clauses = re.split(r'(?<=[,;:])\s+', sentence)
-                            for clause in clauses:
-                                clause_size = len(clause.encode('utf-8'))
-                                
-                                # Add clause to current segment or start new one
-                                if current_size + clause_size > target_size_bytes and current_segment:
-                                    segments.append(current_segment.strip())
-                                    current_segment = clause
-                                    current_size = clause_size
-                                else:
-                                    current_segment += (" " + clause if current_segment else clause)
-                                    current_size += clause_size
-                        else:
-                            # Add sentence to current segment or start new one
-                            if current_size + sent_size > target_size_bytes and current_segment:
-                                segments.append(current_segment.strip())
-                                current_segment = sentence
-                                current_size = sent_size
-                            else:
-                                current_segment += (" " + sentence if current_segment else sentence)
-                                current_size += sent_size
-                else:
-                    # Add line to current segment or start new one
-                    if current_size + line_size > target_size_bytes and current_segment:
-                        segments.append(current_segment.strip())
-                        current_segment = line
-                        current_size = line_size
-                    else:
-                        current_segment += ("\n" + line if current_segment else line)
-                        current_size += line_size
-        else:
-            # Add paragraph to current segment or start new one
-            if current_size + para_size > target_size_bytes and current_segment:
-                segments.append(current_segment.strip())
-                current_segment = para
-                current_size = para_size
-            else:
-                current_segment += ("\n\n" + para if current_segment else para)
-                current_size += para_size
-    
-    # Add final segment
-    if current_segment.strip():
-        segments.append(current_segment.strip())
+    content is a bytes-like buffer of UTF-8 text.
+    Returns (starts, ends, levels): offsets of each piece of text between
+    boundaries, and the level of the boundary that follows each piece.
+    """
+    starts, ends, levels = [], [], []
+    pos = 0
+    for match in BOUNDARY_RE.finditer(content):
+        level = BOUNDARY_LEVELS[match.lastindex]
+        if match.start() > pos:
+            starts.append(pos)
+            ends.append(match.start())
+            levels.append(level)
+        elif levels:
+            # Back-to-back separators (e.g. ". \n\n") - keep the coarsest
+            levels[-1] = max(levels[-1], level)
+        pos = match.end()
+    
+    if pos < len(content):
+        starts.append(pos)
+        ends.append(len(content))
+        levels.append(END_OF_TEXT)
+    elif levels:
+        levels[-1] = END_OF_TEXT
+    return starts, ends, levels
+
+
+def pack_pieces(byte_starts: List[int], byte_ends: List[int], levels: List[int],
+                target_size_bytes: int) -> List[Tuple[int, int]]:
+    """
+    Greedily pack consecutive pieces into runs of at most target_size_bytes.
+    
+    Each run is cut at the coarsest boundary available (paragraph > line >
+    sentence > clause), as long as that leaves the run at least half full.
+    Offsets are increasing, so both the run end and the cut are found with
+    bisect - O(log n) per segment instead of a comparison per piece.
+    Returns (first, last + 1) piece index ranges.
+    """
+    # Piece indices grouped by the level of the boundary that follows them
+    level_positions = {level: [] for level in COARSEST_FIRST_LEVELS}
+    for i, level in enumerate(levels):
+        if level != END_OF_TEXT:
+            level_positions[level].append(i)
     
+    runs = []
+    min_size = target_size_bytes // 2
+    count = len(byte_starts)
+    first = 0
+    while first < count:
+        base = byte_starts[first]
+        # Longest run that fits (always at least one piece)
+        stop = bisect_right(byte_ends, base + target_size_bytes, first + 1)
+        if stop < count:
+            # Prefer cutting at a coarser boundary than the natural one, as
+            # long as the run stays at least half full (ties: latest wins)
+            earliest = bisect_left(byte_ends, base + min_size, first)
+            for level in COARSEST_FIRST_LEVELS:
+                if level <= levels[stop - 1]:
+                    break
+                positions = level_positions[level]
+                idx = bisect_left(positions, stop) - 1
+                if idx >= 0 and positions[idx] >= earliest:
+                    stop = positions[idx] + 1
+                    break
+        runs.append((first, stop))
+        first = stop
+    return runs
+
+
+def split_buffer_at_semantic_boundaries(buffer, target_size_bytes: int) -> List[str]:
+    """
+    Split UTF-8 encoded bytes (e.g. an mmap of the file) at semantic boundaries.
+    
+    Offsets are already byte offsets, so no size math is needed; only the
+    emitted segments are copied out of the buffer and decoded.
+    """
+    if len(buffer) <= target_size_bytes:
+        segment = buffer[:].strip()
+        return [segment.decode('utf-8')] if segment else []
+    
+    starts, ends, levels = find_boundaries(buffer)
+    
+    segments = []
+    for first, stop in pack_pieces(starts, ends, levels, target_size_bytes):
+        segment = buffer[starts[first]:ends[stop - 1]].strip()
+        if segment:
+            segments.append(segment.decode('utf-8'))
     return segments
 
 
-def create_segment_file(original_file: Path, segment_num: int, content: str) -> Path:
-    """Create a segment file with proper naming convention."""
+def create_segment_file(original_file: Path, segment_num: int, content: str) -> Tuple[Path, int]:
+    """
+    Create a segment file with proper naming convention.
+    Returns (segment_path, bytes_written) so callers don't need to stat() it.
+    """
     base_name = original_file.stem
     extension = original_file.suffix
     segment_name = f"{base_name}_{segment_num:02d}{extension}"
     segment_path = original_file.parent / segment_name
-    segment_path.write_text(content, encoding='utf-8')
-    return segment_path
+    data = content.encode('utf-8')
+    segment_path.write_bytes(data)
+    return segment_path, len(data)
+
+
+created_dirs = set()  # Per process - directories already created by ensure_dir()
+
+
+def ensure_dir(directory: Path):
+    """mkdir -p, skipping the syscall for directories this process already created."""
+    if directory not in created_dirs:
+        directory.mkdir(parents=True, exist_ok=True)
+        created_dirs.add(directory)
 
 
 def backup_original_file(file_path: Path, backup_dir: Path) -> Path:
     """Move original file to backup directory."""
-    backup_dir.mkdir(parents=True, exist_ok=True)
     relative_path = file_path.relative_to(TRANSCRIPTS_DIR)
     backup_path = backup_dir / relative_path
-    backup_path.parent.mkdir(parents=True, exist_ok=True)
-    shutil.move(str(file_path), str(backup_path))
+    # parents=True also creates backup_dir itself
+    ensure_dir(backup_path.parent)
+    try:
+        # Same filesystem (the usual case): a single metadata operation
+        os.rename(file_path, backup_path)
+    except OSError:
+        # Cross-device or otherwise not renameable - copy and delete instead
+        shutil.move(str(file_path), str(backup_path))
     return backup_path
 
 
-def process_file(file_path: Path, backup_dir: Path) -> Tuple[bool, int]:
-    """Process a single file: split if needed, return (was_split, num_segments)."""
+def new_file_stats() -> dict:
+    """Empty per-file stats, merged into the global stats by main()."""
+    return {
+        'files_split': 0,
+        'segments_created': 0,
+        'files_skipped': 0,
+        'total_original_size_mb': 0,
+        'total_segments_size_mb': 0
+    }
+
+
+def process_file(file_path: Path, backup_dir: Path) -> Tuple[dict, List[str]]:
+    """
+    Process a single file: split if needed.
+    Runs in a worker process, so returns (file_stats, output_lines) instead of
+    updating the global stats or printing directly.
+    """
+    file_stats = new_file_stats()
+    output = []
+    
     file_size_bytes = file_path.stat().st_size
     file_size_mb = file_size_bytes / (1024 * 1024)
     
-    stats['total_original_size_mb'] += file_size_mb
+    file_stats['total_original_size_mb'] += file_size_mb
     
     # If file is small enough, skip it
     if file_size_bytes <= MAX_SEGMENT_SIZE_BYTES:
-        print(f"  ✓ Skipping (already small): {file_path.name} ({file_size_mb:.3f}MB)")
-        stats['files_skipped'] += 1
-        return False, 1
+        output.append(f"  ✓ Skipping (already small): {file_path.name} ({file_size_mb:.3f}MB)")
+        file_stats['files_skipped'] += 1
+        return file_stats, output
     
-    print(f"  📄 Processing: {file_path.name} ({file_size_mb:.3f}MB)")
+    output.append(f"  📄 Processing: {file_path.name} ({file_size_mb:.3f}MB)")
     
-    # Read file content
+    # Map the file and split straight from the page cache - only the
+    # emitted segments are copied and decoded
     try:
-        content = file_path.read_text(encoding='utf-8')
+        with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            segments = split_buffer_at_semantic_boundaries(mm, MAX_SEGMENT_SIZE_BYTES)
     except Exception as e:
-        print(f"  ✗ Error reading file: {e}")
-        return False, 0
-    
-    # Split into segments
-    segments = split_at_semantic_boundaries(content, MAX_SEGMENT_SIZE_BYTES)
+        output.append(f"  ✗ Error reading file: {e}")
+        return file_stats, output
     
     if len(segments) <= 1:
-        print(f"  ⚠️  Could not split further, keeping original")
-        stats['files_skipped'] += 1
-        return False, 1
+        output.append(f"  ⚠️  Could not split further, keeping original")
+        file_stats['files_skipped'] += 1
+        return file_stats, output
     
-    print(f"     → Splitting into {len(segments)} segments...")
+    output.append(f"     → Splitting into {len(segments)} segments...")
     
     # Create segment files
     segment_files = []
     total_segments_size = 0
     
     for i, segment_content in enumerate(segments, 1):
-        segment_file = create_segment_file(file_path, i, segment_content)
+        segment_file, segment_size = create_segment_file(file_path, i, segment_content)
         segment_files.append(segment_file)
-        segment_size = segment_file.stat().st_size
         total_segments_size += segment_size
-        stats['segments_created'] += 1
+        file_stats['segments_created'] += 1
     
     # Backup original file
     if BACKUP_ORIGINALS:
         backup_path = backup_original_file(file_path, backup_dir)
         try:
-            backup_relative = backup_path.relative_to(Path.cwd())
-            print(f"     → Original backed up to: {backup_relative}")
+            backup_relative = backup_path.relative_to(CWD)
+            output.append(f"     → Original backed up to: {backup_relative}")
         except ValueError:
-            print(f"     → Original backed up to: {backup_path}")
+            output.append(f"     → Original backed up to: {backup_path}")
     
-    stats['files_split'] += 1
-    stats['total_segments_size_mb'] += (total_segments_size / (1024 * 1024))
+    file_stats['files_split'] += 1
+    file_stats['total_segments_size_mb'] += (total_segments_size / (1024 * 1024))
     
-    print(f"     ✓ Created {len(segments)} segments")
-    return True, len(segments)
+    output.append(f"     ✓ Created {len(segments)} segments")
+    return file_stats, output
+
+
+def iter_transcript_files(root: Path):
+    """
+    Yield .txt files under root as each directory is listed.
+    
+    os.walk lists a directory before yielding its files, so segment files that
+    workers write next to an original are never picked up by the same walk.
+    """
+    for dir_path, _, file_names in os.walk(root):
+        for file_name in file_names:
+            if file_name.endswith('.txt'):
+                yield Path(dir_path) / file_name
 
 
 def main():
     """Main orchestration function."""
-    print("=" * 70)
-    print("LOCAL FILE SPLITTING - PRE-INGESTION")
-    print("=" * 70)
-    print(f"Source directory: {TRANSCRIPTS_DIR}")
-    print(f"Max segment size: {MAX_SEGMENT_SIZE_BYTES / 1024:.2f}KB (0.01MB)")
-    print(f"Backup originals: {BACKUP_ORIGINALS}")
-    print()
+    logger.info("=" * 70)
+    logger.info("LOCAL FILE SPLITTING - PRE-INGESTION")
+    logger.info("=" * 70)
+    logger.info(f"Source directory: {TRANSCRIPTS_DIR}")
+    logger.info(f"Max segment size: {MAX_SEGMENT_SIZE_BYTES / 1024:.2f}KB (0.01MB)")
+    logger.info(f"Backup originals: {BACKUP_ORIGINALS}")
+    logger.info("")
     
     # Check if transcripts directory exists
     if not TRANSCRIPTS_DIR.exists():
-        print(f"✗ Error: Directory '{TRANSCRIPTS_DIR}' does not exist!")
+        logger.error(f"✗ Error: Directory '{TRANSCRIPTS_DIR}' does not exist!")
         return 1
     
     # Create backup directory
     backup_dir = Path('10K2K v2_backup')
     if BACKUP_ORIGINALS:
-        print(f"Backup directory: {backup_dir}")
-        print()
-    
-    # Find all .txt files
-    print("Scanning for transcript files...")
-    txt_files = list(TRANSCRIPTS_DIR.rglob('*.txt'))
-    print(f"Found {len(txt_files)} transcript files")
-    print()
-    
-    if not txt_files:
-        print("No transcript files found!")
-        return 0
+        logger.info(f"Backup directory: {backup_dir}")
+        logger.info("")
     
     # Process each file
-    print("=" * 70)
-    print("PROCESSING FILES")
-    print("=" * 70)
-    print()
+    logger.info("=" * 70)
+    logger.info("PROCESSING FILES")
+    logger.info("=" * 70)
+    logger.info("")
     
-    for i, file_path in enumerate(txt_files, 1):
-        print(f"[{i}/{len(txt_files)}] {file_path.relative_to(TRANSCRIPTS_DIR)}")
-        was_split, num_segments = process_file(file_path, backup_dir)
-        stats['files_processed'] += 1
-        print()
+    # Files are independent and splitting is CPU-bound - fan out across cores.
+    # Files are submitted as the directory walk finds them, so workers start
+    # before the walk finishes. Output is logged as each file completes.
+    logger.info("Scanning for transcript files...")
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        futures = {
+            executor.submit(process_file, file_path, backup_dir): file_path
+            for file_path in iter_transcript_files(TRANSCRIPTS_DIR)
+        }
+        logger.info(f"Found {len(futures)} transcript files")
+        logger.info("")
+        
+        if not futures:
+            logger.info("No transcript files found!")
+            return 0
+        
+        for i, future in enumerate(as_completed(futures), 1):
+            file_path = futures[future]
+            file_stats, output = future.result()
+            # One log record (one write) per file rather than one per line
+            logger.info("\n".join([
+                f"[{i}/{len(futures)}] {file_path.relative_to(TRANSCRIPTS_DIR)}",
+                *output,
+                ""
+            ]))
+            for key, value in file_stats.items():
+                stats[key] += value
+            stats['files_processed'] += 1
     
     # Print summary
-    print("=" * 70)
-    print("SPLITTING SUMMARY")
-    print("=" * 70)
-    print(f"Files processed: {stats['files_processed']}")
-    print(f"Files split: {stats['files_split']}")
-    print(f"Files skipped (already small): {stats['files_skipped']}")
-    print(f"Total segments created: {stats['segments_created']}")
-    print(f"Original total size: {stats['total_original_size_mb']:.2f}MB")
-    print(f"Segments total size: {stats['total_segments_size_mb']:.2f}MB")
+    logger.info("=" * 70)
+    logger.info("SPLITTING SUMMARY")
+    logger.info("=" * 70)
+    logger.info(f"Files processed: {stats['files_processed']}")
+    logger.info(f"Files split: {stats['files_split']}")
+    logger.info(f"Files skipped (already small): {stats['files_skipped']}")
+    logger.info(f"Total segments created: {stats['segments_created']}")
+    logger.info(f"Original total size: {stats['total_original_size_mb']:.2f}MB")
+    logger.info(f"Segments total size: {stats['total_segments_size_mb']:.2f}MB")
     
     if BACKUP_ORIGINALS:
-        print(f"\nOriginal files backed up to: {backup_dir}")
+        logger.info(f"\nOriginal files backed up to: {backup_dir}")
     
-    print()
-    print("=" * 70)
-    print("✅ FILE SPLITTING COMPLETE")
-    print("=" * 70)
-    print()
-    print("Next step: Run ingestion script to upload all segments to ChromaDB")
-    print()
+    logger.info("")
+    logger.info("=" * 70)
+    logger.info("✅ FILE SPLITTING COMPLETE")
+    logger.info("=" * 70)
+    logger.info("")
+    logger.info("Next step: Run ingestion script to upload all segments to ChromaDB")
+    logger.info("")
     
     return 0
 
 
 if __name__ == "__main__":
     import sys
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
     sys.exit(main())
 
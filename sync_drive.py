@@ -7,6 +7,8 @@ No manual login required after first setup.
 
 import os
 import sys
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from pathlib import Path
 from pydrive2.auth import GoogleAuth
 from pydrive2.drive import GoogleDrive
@@ -22,6 +24,14 @@ VIDEO_DIR = Path(os.getenv('VIDEO_DIR', str(SOURCE_DATA_DIR / 'videos')))
 # Supported file types
 PDF_MIME_TYPE = 'application/pdf'
 MP4_MIME_TYPE = 'video/mp4'
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+# Folder listings - request only the fields we use (GetList pages through every result)
+LIST_FIELDS = 'items(id,title,mimeType,fileSize,md5Checksum),nextPageToken'
+LIST_WORKERS = 8  # Folders listed in parallel during the scan
+
+# Concurrent downloads - each one is network-bound, so threads overlap the waits
+DOWNLOAD_WORKERS = int(os.getenv('DOWNLOAD_WORKERS', '8'))
 
 
 def authenticate() -> GoogleDrive:
@@ -80,52 +90,120 @@ get_refresh_token: True
 
 
 def get_all_files_in_folder(drive: GoogleDrive, folder_id: str) -> list:
-    """Recursively get all files in a Google Drive folder and subfolders."""
+    """Get all files in a Google Drive folder and its subfolders, listing folders concurrently."""
     all_files = []
     
     def list_files_in_folder(folder_id: str):
-        """List files in a specific folder."""
+        """List one folder, returning (files, subfolder_ids)."""
+        files, subfolder_ids = [], []
         try:
             # List files in the folder
             file_list = drive.ListFile({
-                'q': f"'{folder_id}' in parents and trashed=false"
+                'q': f"'{folder_id}' in parents and trashed=false",
+                'fields': LIST_FIELDS
             }).GetList()
             
             for file_item in file_list:
                 mime_type = file_item.get('mimeType', '')
                 
-                # If it's a folder, recurse into it
-                if mime_type == 'application/vnd.google-apps.folder':
-                    list_files_in_folder(file_item['id'])
+                # Folders go back on the queue; everything else is a file
+                if mime_type == FOLDER_MIME_TYPE:
+                    subfolder_ids.append(file_item['id'])
                 else:
-                    # It's a file, add to our list
-                    all_files.append(file_item)
+                    files.append(file_item)
                     
         except Exception as e:
             print(f"Error listing files in folder {folder_id}: {e}")
+        return files, subfolder_ids
     
-    list_files_in_folder(folder_id)
+    # Breadth-first: every folder discovered so far is listed in parallel, and
+    # results are merged here on the main thread, so all_files needs no lock
+    pending = deque([folder_id])
+    with ThreadPoolExecutor(max_workers=LIST_WORKERS) as executor:
+        in_flight = set()
+        while pending or in_flight:
+            while pending:
+                in_flight.add(executor.submit(list_files_in_folder, pending.popleft()))
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, subfolder_ids = future.result()
+                all_files.extend(files)
+                pending.extend(subfolder_ids)
     return all_files
 
 
+created_dirs = set()  # Destination directories already created this run
+
+
 def download_file(drive: GoogleDrive, file_item, destination: Path) -> bool:
     """Download a file from Google Drive."""
     try:
         file_name = file_item['title']
         file_path = destination / file_name
         
-        # Create destination directory if it doesn't exist
-        destination.mkdir(parents=True, exist_ok=True)
+        # Create destination directory if it doesn't exist (once per directory)
+        if destination not in created_dirs:
+            destination.mkdir(parents=True, exist_ok=True)
+            created_dirs.add(destination)
         
-        # Download the file with progress
-        print(f"  Downloading: {file_name}...", end='', flush=True)
-        file_item.GetContentFile(str(file_path))
-        print(f" ✓")
+        # Download to a .part file and rename when complete, so an interrupted
+        # download never leaves a truncated file under the real name
+        partial_path = file_path.with_name(file_name + '.part')
+        file_item.GetContentFile(str(partial_path))
+        os.replace(partial_path, file_path)
+        print(f"  ✓ Downloaded: {file_name}")
         return True
         
     except Exception as e:
-        print(f" ✗ Error: {e}")
+        print(f"  ✗ Error downloading {file_item.get('title', '?')}: {e}")
+        return False
+
+
+def is_already_downloaded(file_item, file_path: Path) -> bool:
+    """True if file_path exists and matches the Drive file's size (when Drive reports one)."""
+    try:
+        local_size = file_path.stat().st_size
+    except FileNotFoundError:
         return False
+    expected_size = file_item.get('fileSize')
+    if expected_size is None:
+        return True  # Drive gives no size (e.g. Google Docs) - trust existence
+    return local_size == int(expected_size)
+
+
+def download_files(drive: GoogleDrive, file_items: list, destination: Path, label: str):
+    """Download files missing from destination concurrently and print a summary."""
+    # Drive allows duplicate titles, but they all land on the same local path -
+    # keep one per title (lowest id, so the same copy wins on every run) and
+    # never download two files into the same .part at once
+    by_title = {}
+    for file_item in sorted(file_items, key=lambda f: f['id']):
+        file_name = file_item['title']
+        if file_name in by_title:
+            print(f"  ⚠️  Duplicate title, skipping: {file_name} (id {file_item['id']}, keeping id {by_title[file_name]['id']})")
+        else:
+            by_title[file_name] = file_item
+    
+    to_download = []
+    skipped = 0
+    for file_item in by_title.values():
+        file_name = file_item['title']
+        if is_already_downloaded(file_item, destination / file_name):
+            print(f"  ⊘ Skipped (exists): {file_name}")
+            skipped += 1
+        else:
+            to_download.append(file_item)
+    
+    downloaded = 0
+    if to_download:
+        print(f"  Downloading {len(to_download)} files ({DOWNLOAD_WORKERS} at a time)...")
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+            futures = [executor.submit(download_file, drive, file_item, destination) for file_item in to_download]
+            for future in as_completed(futures):
+                if future.result():
+                    downloaded += 1
+    
+    print(f"\n{label}: {downloaded} downloaded, {skipped} skipped")
 
 
 def main():
@@ -164,40 +242,12 @@ def main():
     # Download PDFs
     if pdf_files:
         print(f"\n[3/3] Processing {len(pdf_files)} PDF files...")
-        downloaded = 0
-        skipped = 0
-        
-        for file_item in pdf_files:
-            file_name = file_item['title']
-            file_path = PDF_DIR / file_name
-            
-            if file_path.exists():
-                print(f"  ⊘ Skipped (exists): {file_name}")
-                skipped += 1
-            else:
-                if download_file(drive, file_item, PDF_DIR):
-                    downloaded += 1
-        
-        print(f"\nPDFs: {downloaded} downloaded, {skipped} skipped")
+        download_files(drive, pdf_files, PDF_DIR, "PDFs")
     
     # Download MP4s
     if mp4_files:
         print(f"\n[3/3] Processing {len(mp4_files)} MP4 files...")
-        downloaded = 0
-        skipped = 0
-        
-        for file_item in mp4_files:
-            file_name = file_item['title']
-            file_path = VIDEO_DIR / file_name
-            
-            if file_path.exists():
-                print(f"  ⊘ Skipped (exists): {file_name}")
-                skipped += 1
-            else:
-                if download_file(drive, file_item, VIDEO_DIR):
-                    downloaded += 1
-        
-        print(f"\nMP4s: {downloaded} downloaded, {skipped} skipped")
+        download_files(drive, mp4_files, VIDEO_DIR, "MP4s")
     
     print("\n" + "=" * 50)
     print("Sync complete!")
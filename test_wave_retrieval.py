@@ -4,10 +4,10 @@ Test if WAVE-related documents are in ChromaDB and can be retrieved.
 """
 
 import os
+import re
 from dotenv import load_dotenv
 import chromadb
 from langchain_openai import OpenAIEmbeddings
-from langchain_chroma import Chroma
 
 load_dotenv()
 
@@ -16,6 +16,13 @@ CHROMA_PORT = int(os.getenv('CHROMA_PORT', '8000'))
 CHROMA_URL = os.getenv('CHROMA_URL', None)
 COLLECTION_NAME = os.getenv('COLLECTION_NAME', '10k2k_transcripts')
 
+# Any WAVE mention - one case-insensitive pass, no lowercased copy of each document
+WAVE_RE = re.compile(r'wave|w\.a\.v\.e|wall art vision', re.IGNORECASE)
+
+# Direct scan: documents fetched per page, and how many matches to show
+SCAN_PAGE_SIZE = 200
+MAX_WAVE_DOCS_SHOWN = 10
+
 def main():
     print("=" * 70)
     print("TESTING WAVE RETRIEVAL FROM CHROMADB")
@@ -46,14 +53,8 @@ def main():
             print("   The WAVE documents need to be ingested.")
             return 1
         
-        # Initialize vectorstore for similarity search
         print("\n🔍 Testing similarity search for WAVE...")
         embeddings = OpenAIEmbeddings(openai_api_key=os.getenv('OPENAI_API_KEY'))
-        vectorstore = Chroma(
-            client=client,
-            collection_name=COLLECTION_NAME,
-            embedding_function=embeddings,
-        )
         
         # Test queries
         test_queries = [
@@ -63,22 +64,35 @@ def main():
             "W.A.V.E. framework"
         ]
         
-        for query in test_queries:
+        # Embed every query in one API call, then run them as one ChromaDB query
+        query_embeddings = embeddings.embed_documents(test_queries)
+        results = collection.query(
+            query_embeddings=query_embeddings,
+            n_results=5,
+            include=['documents', 'metadatas', 'distances']
+        )
+        
+        for query, ids, documents, metadatas, distances in zip(
+            test_queries,
+            results['ids'],
+            results['documents'],
+            results['metadatas'],
+            results['distances']
+        ):
             print(f"\n{'='*70}")
             print(f"Query: '{query}'")
             print('='*70)
             
-            docs_with_scores = vectorstore.similarity_search_with_score(query, k=5)
-            
-            if not docs_with_scores:
+            if not ids:
                 print("  ✗ No documents found!")
                 continue
             
-            print(f"  Found {len(docs_with_scores)} documents:")
+            print(f"  Found {len(ids)} documents:")
             
-            for i, (doc, score) in enumerate(docs_with_scores, 1):
+            for i, (content, metadata, score) in enumerate(zip(documents, metadatas, distances), 1):
                 print(f"\n  [{i}] Score: {score:.4f} (lower = better)")
-                metadata = doc.metadata if hasattr(doc, 'metadata') else {}
+                metadata = metadata or {}
+                content = content or ''
                 filename = (
                     metadata.get('filename') or
                     metadata.get('file_source') or
@@ -88,15 +102,14 @@ def main():
                 print(f"      File: {filename}")
                 
                 # Check if content mentions WAVE
-                content_lower = doc.page_content.lower()
-                if 'wave' in content_lower or 'w.a.v.e' in content_lower or 'wall art vision' in content_lower:
+                if WAVE_RE.search(content):
                     print(f"      ✓ Contains WAVE-related content")
                     # Show snippet
-                    snippet = doc.page_content[:300].replace('\n', ' ')
+                    snippet = content[:300].replace('\n', ' ')
                     print(f"      Preview: {snippet}...")
                 else:
                     print(f"      ⚠️  Doesn't appear to contain WAVE content")
-                    snippet = doc.page_content[:200].replace('\n', ' ')
+                    snippet = content[:200].replace('\n', ' ')
                     print(f"      Preview: {snippet}...")
         
         # Also search directly in ChromaDB for WAVE mentions
@@ -104,27 +117,38 @@ def main():
         print("SEARCHING CHROMADB DIRECTLY FOR 'WAVE' IN CONTENT")
         print('='*70)
         
-        # Get sample of documents and search for WAVE
+        # Page through a sample of documents and search for WAVE - one page in memory
+        # at a time, no embeddings, and stop once we have enough to show
         sample_size = min(1000, total_count)
-        all_docs = collection.get(limit=sample_size)
+        scanned = 0
         
         wave_docs = []
-        for i, (doc_id, content, metadata) in enumerate(zip(
-            all_docs.get('ids', []),
-            all_docs.get('documents', []),
-            all_docs.get('metadatas', [])
-        )):
-            if content and ('wave' in content.lower() or 'w.a.v.e' in content.lower() or 'wall art vision' in content.lower()):
-                filename = (
-                    (metadata or {}).get('filename') or
-                    (metadata or {}).get('file_source') or
-                    (metadata or {}).get('original_file') or
-                    doc_id
-                )
-                wave_docs.append((filename, content[:200]))
+        for offset in range(0, sample_size, SCAN_PAGE_SIZE):
+            page = collection.get(
+                limit=min(SCAN_PAGE_SIZE, sample_size - offset),
+                offset=offset,
+                include=['documents', 'metadatas']
+            )
+            page_ids = page.get('ids', [])
+            scanned += len(page_ids)
+            for doc_id, content, metadata in zip(
+                page_ids,
+                page.get('documents', []),
+                page.get('metadatas', [])
+            ):
+                if content and WAVE_RE.search(content):
+                    filename = (
+                        (metadata or {}).get('filename') or
+                        (metadata or {}).get('file_source') or
+                        (metadata or {}).get('original_file') or
+                        doc_id
+                    )
+                    wave_docs.append((filename, content[:200]))
+            if len(wave_docs) >= MAX_WAVE_DOCS_SHOWN or not page_ids:
+                break
         
-        print(f"\nFound {len(wave_docs)} documents containing 'WAVE' in first {sample_size} documents:")
-        for filename, preview in wave_docs[:10]:  # Show first 10
+        print(f"\nFound {len(wave_docs)} documents containing 'WAVE' in first {scanned} documents:")
+        for filename, preview in wave_docs[:MAX_WAVE_DOCS_SHOWN]:
             print(f"  ✓ {filename}")
             print(f"    {preview}...")
         
@@ -4,18 +4,29 @@ Video Transcription Script
 Uses OpenAI Whisper API to transcribe video/audio files to text.
 """
 
+import asyncio
+import contextlib
+import hashlib
+import logging
 import os
+import random
+import sqlite3
 import sys
 import subprocess
 import tempfile
 import shutil
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Optional
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import APIConnectionError, APIStatusError, AsyncOpenAI
 
-# Load environment variables
-load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Load environment variables - skipped when the environment is already provided (e.g. containers)
+if 'OPENAI_API_KEY' not in os.environ:
+    load_dotenv(override=False)
 
 # Directories - can be overridden via environment variables
 SOURCE_DATA_DIR = Path(os.getenv('SOURCE_DATA_DIR', 'data'))
@@ -23,6 +34,9 @@ SOURCE_DATA_DIR = Path(os.getenv('SOURCE_DATA_DIR', 'data'))
 VIDEO_DIR = Path(os.getenv('VIDEO_DIR', '/Users/justinlin/Documents/10K2KChatBot/10K2Kv2'))
 TRANSCRIPT_DIR = Path(os.getenv('TRANSCRIPT_DIR', str(SOURCE_DATA_DIR / 'transcripts')))
 
+# Chunk transcripts of large files, kept until the whole file is done so a rerun skips them
+CHECKPOINT_DB = TRANSCRIPT_DIR / 'chunk_checkpoints.db'
+
 # Supported video/audio file extensions
 SUPPORTED_EXTENSIONS = {'.mp4', '.avi', '.mov', '.mkv', '.webm', '.flv', '.m4v',
                         '.mp3', '.wav', '.m4a', '.flac', '.ogg', '.wma'}
@@ -33,32 +47,52 @@ MAX_FILE_SIZE = 25 * 1024 * 1024  # 25MB in bytes
 # Chunk size for splitting large files (slightly under 25MB to be safe)
 CHUNK_SIZE_TARGET = 23 * 1024 * 1024  # 23MB in bytes
 
+# Triage filesystem checks run in parallel - on network mounts each stat is a round trip
+TRIAGE_WORKERS = 32
+
+# Whisper only needs speech: 16 kHz mono Opus is a small fraction of a video's size
+AUDIO_ENCODE_ARGS = ('-vn', '-ac', '1', '-ar', '16000', '-c:a', 'libopus')
+AUDIO_BITRATE = '32k'
+
+# Whisper uploads in flight at once - can be overridden via environment variable
+MAX_CONCURRENT_UPLOADS = int(os.getenv('MAX_CONCURRENT_UPLOADS', '8'))
+
+# Retries for transient Whisper failures (429, 5xx, dropped connections)
+WHISPER_MAX_RETRIES = 5
+WHISPER_BACKOFF_BASE = 1.0  # seconds
+WHISPER_BACKOFF_CAP = 30.0  # seconds
+
 
-def get_openai_client() -> OpenAI:
+def get_openai_client() -> AsyncOpenAI:
     """Initialize OpenAI client with API key from environment."""
     api_key = os.getenv('OPENAI_API_KEY')
     if not api_key:
-        print("ERROR: OPENAI_API_KEY not found in environment variables!")
-        print("Please add OPENAI_API_KEY to your .env file:")
-        print("  OPENAI_API_KEY=your_api_key_here")
+        logger.error("ERROR: OPENAI_API_KEY not found in environment variables!")
+        logger.error("Please add OPENAI_API_KEY to your .env file:")
+        logger.error("  OPENAI_API_KEY=your_api_key_here")
         sys.exit(1)
     
-    return OpenAI(api_key=api_key)
+    # Retries are handled by whisper_transcribe, which backs off outside the upload semaphore
+    return AsyncOpenAI(api_key=api_key, max_retries=0)
 
 
 def get_video_files() -> List[Path]:
     """Recursively scan VIDEO_DIR for supported video/audio files."""
     if not VIDEO_DIR.exists():
-        print(f"ERROR: Video directory '{VIDEO_DIR}' does not exist!")
+        logger.error(f"ERROR: Video directory '{VIDEO_DIR}' does not exist!")
         sys.exit(1)
     
-    # Use rglob to recursively search for video files in all subdirectories
+    # One scandir walk over all subdirectories, matching every extension per entry
     video_files = []
-    for ext in SUPPORTED_EXTENSIONS:
-        video_files.extend(VIDEO_DIR.rglob(f'*{ext}'))
+    pending_dirs = [VIDEO_DIR]
+    while pending_dirs:
+        with os.scandir(pending_dirs.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending_dirs.append(entry.path)
+                elif os.path.splitext(entry.name)[1].lower() in SUPPORTED_EXTENSIONS and entry.is_file():
+                    video_files.append(Path(entry.path))
     
-    # Filter to only files (not directories) and sort
-    video_files = [f for f in video_files if f.is_file()]
     return sorted(video_files)
 
 
@@ -71,13 +105,47 @@ def get_transcript_path(video_file: Path) -> Path:
     return video_file.parent / transcript_name
 
 
+def open_checkpoint_db() -> sqlite3.Connection:
+    """Open (creating if needed) the chunk transcript checkpoint database."""
+    db = sqlite3.connect(CHECKPOINT_DB)
+    db.execute('PRAGMA journal_mode=WAL')
+    db.execute(
+        'CREATE TABLE IF NOT EXISTS chunks ('
+        'video_key TEXT, chunk_index INTEGER, transcript TEXT, '
+        'PRIMARY KEY (video_key, chunk_index))'
+    )
+    return db
+
+
+def video_checkpoint_key(video_file: Path) -> str:
+    """Identify a video's chunking across runs.
+    Changes if the file is edited or the chunking settings change, which would shift chunk boundaries.
+    """
+    st = video_file.stat()
+    identity = f"{video_file.resolve()}:{st.st_size}:{st.st_mtime_ns}:{AUDIO_BITRATE}:{CHUNK_SIZE_TARGET}"
+    return hashlib.sha1(identity.encode()).hexdigest()[:16]
+
+
+def triage_file(video_file: Path) -> Optional[int]:
+    """Size of video_file in bytes, or None if it already has a transcript."""
+    if get_transcript_path(video_file).exists():
+        return None
+    return video_file.stat().st_size
+
+
+def size_mb(size_bytes: int) -> float:
+    """Convert a byte count to megabytes."""
+    return size_bytes / (1024 * 1024)
+
+
 def file_size_mb(file_path: Path) -> float:
     """Get file size in megabytes."""
-    return file_path.stat().st_size / (1024 * 1024)
+    return size_mb(file_path.stat().st_size)
 
 
+@lru_cache(maxsize=1)
 def check_ffmpeg() -> bool:
-    """Check if ffmpeg is available on the system."""
+    """Check if ffmpeg is available on the system (probed once per run)."""
     try:
         subprocess.run(['ffmpeg', '-version'], 
                       capture_output=True, 
@@ -103,11 +171,58 @@ def get_video_duration(video_file: Path) -> Optional[float]:
         return None
 
 
-def split_video_into_chunks(video_file: Path, temp_dir: Path) -> List[Path]:
-    """Split a large video file into chunks under 25MB.
-    Returns list of chunk file paths.
+async def run_ffmpeg(*args: str) -> None:
+    """Run ffmpeg without blocking the event loop; raise CalledProcessError on failure.
+    If the caller is cancelled, ffmpeg is killed rather than left writing in the background.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        'ffmpeg', *args,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        _, stderr = await proc.communicate()
+    except asyncio.CancelledError:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, ['ffmpeg', *args], stderr=stderr)
+
+
+async def shrink_chunk(chunk_path: Path, reencode_slots: asyncio.Semaphore) -> Optional[Path]:
+    """Re-encode an oversized chunk as lower-bitrate audio, replacing the original.
+    Returns the new path, or None if ffmpeg failed.
     """
-    duration = get_video_duration(video_file)
+    smaller_path = chunk_path.with_name(f"{chunk_path.stem}_small.ogg")
+    try:
+        async with reencode_slots:
+            await run_ffmpeg(
+                '-i', str(chunk_path),
+                *AUDIO_ENCODE_ARGS, '-b:a', '16k',  # Lower bitrate
+                '-threads', '1',  # Parallelism comes from running several re-encodes
+                str(smaller_path)
+            )
+    except subprocess.CalledProcessError as e:
+        logger.warning(f"    Warning: Error re-encoding {chunk_path.name}: {e}")
+        return None
+    finally:
+        chunk_path.unlink()
+    
+    if smaller_path.stat().st_size == 0:
+        return None
+    return smaller_path
+
+
+async def split_video_into_chunks(video_file: Path, temp_dir: Path) -> AsyncIterator[Tuple[int, Optional[Path]]]:
+    """Split a large video/audio file into chunks under 25MB.
+    Yields (chunk index, path) as soon as each chunk is ready - oversized chunks
+    are re-encoded in the background, so indices may arrive out of order.
+    The path is None for a chunk that was lost (empty segment or failed re-encode).
+    Raises RuntimeError once the chunks are handed over if ffmpeg failed partway.
+    """
+    duration = await asyncio.to_thread(get_video_duration, video_file)
     file_size = video_file.stat().st_size
     
     if duration is None:
@@ -122,59 +237,121 @@ def split_video_into_chunks(video_file: Path, temp_dir: Path) -> List[Path]:
     # Round to nearest 10 seconds for cleaner splits
     chunk_duration_seconds = max(10, int(chunk_duration_seconds / 10) * 10)
     
-    chunks = []
-    start_time = 0
-    chunk_num = 0
+    logger.info(f"    Splitting into ~{int(duration / chunk_duration_seconds) + 1} chunks...")
     
-    print(f"    Splitting into ~{int(duration / chunk_duration_seconds) + 1} chunks...", end='', flush=True)
+    # One ffmpeg pass writes every segment; the segment list on stdout names
+    # each chunk as soon as it is closed, so uploads start before the split ends
+    proc = await asyncio.create_subprocess_exec(
+        'ffmpeg', '-loglevel', 'error',
+        '-i', str(video_file),
+        '-f', 'segment',
+        '-segment_time', str(chunk_duration_seconds),
+        '-segment_start_number', '1',
+        '-reset_timestamps', '1',
+        '-c', 'copy',  # Copy codec to avoid re-encoding (faster)
+        '-segment_list', 'pipe:1',
+        '-segment_list_type', 'flat',
+        str(temp_dir / f"chunk_%03d{video_file.suffix}"),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    stderr_task = asyncio.create_task(proc.stderr.read())
     
-    while start_time < duration:
-        chunk_num += 1
-        chunk_path = temp_dir / f"chunk_{chunk_num:03d}.mp4"
-        
-        # Use ffmpeg to extract a segment
-        try:
-            subprocess.run(
-                ['ffmpeg', '-i', str(video_file),
-                 '-ss', str(start_time),
-                 '-t', str(chunk_duration_seconds),
-                 '-c', 'copy',  # Copy codec to avoid re-encoding (faster)
-                 '-avoid_negative_ts', 'make_zero',
-                 str(chunk_path)],
-                capture_output=True,
-                check=True
-            )
+    # Re-encodes run alongside the split, at most one per core
+    reencode_slots = asyncio.Semaphore(os.cpu_count() or 1)
+    reencodes = {}  # Task -> chunk index
+    
+    try:
+        chunk_num = 0
+        async for line in proc.stdout:
+            chunk_num += 1
+            chunk_path = temp_dir / line.decode().strip()
             
             # Check if chunk is still too large (may happen with variable bitrate)
-            if chunk_path.exists() and chunk_path.stat().st_size > MAX_FILE_SIZE:
-                # Re-encode with lower bitrate if needed
-                chunk_path.unlink()
-                subprocess.run(
-                    ['ffmpeg', '-i', str(video_file),
-                     '-ss', str(start_time),
-                     '-t', str(chunk_duration_seconds),
-                     '-b:v', '500k',  # Lower bitrate
-                     '-b:a', '64k',
-                     str(chunk_path)],
-                    capture_output=True,
-                    check=True
-                )
-            
-            if chunk_path.exists() and chunk_path.stat().st_size > 0:
-                chunks.append(chunk_path)
+            chunk_size = chunk_path.stat().st_size
+            if chunk_size > MAX_FILE_SIZE:
+                reencodes[asyncio.create_task(shrink_chunk(chunk_path, reencode_slots))] = chunk_num
+            else:
+                yield chunk_num, (chunk_path if chunk_size > 0 else None)
             
-            start_time += chunk_duration_seconds
-            
-        except subprocess.CalledProcessError as e:
-            print(f"\n    Warning: Error creating chunk {chunk_num}: {e}")
-            break
+            # Hand over any re-encodes that finished in the meantime
+            for task in [task for task in reencodes if task.done()]:
+                yield reencodes.pop(task), task.result()
+        
+        await proc.wait()
+        
+        # Wait for the remaining re-encodes
+        while reencodes:
+            done, _ = await asyncio.wait(reencodes, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield reencodes.pop(task), task.result()
+        
+        # A split that died partway never cut the rest of the file - fail it
+        # (after handing over every chunk it did cut) so it is not finalized
+        if proc.returncode != 0:
+            stderr = (await stderr_task).decode(errors='replace').strip()
+            raise RuntimeError(f"ffmpeg exited with code {proc.returncode} while splitting after {chunk_num} chunk(s): {stderr}")
     
-    print(f" ✓ ({len(chunks)} chunks)")
-    return chunks
+    finally:
+        # Stop ffmpeg and any re-encodes if the consumer gave up early, and wait
+        # for them to exit so nothing is still writing into temp_dir
+        for task in reencodes:
+            task.cancel()
+        await asyncio.gather(*reencodes, return_exceptions=True)
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        await stderr_task
+
+
+def is_retryable(error: Exception) -> bool:
+    """True for rate limits, server errors and dropped connections."""
+    if isinstance(error, APIConnectionError):  # Includes timeouts
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+def retry_after_seconds(error: Exception) -> float:
+    """Retry-After header of a failed response, or 0 if absent or not in seconds."""
+    try:
+        return float(error.response.headers.get('retry-after', 0))
+    except (AttributeError, TypeError, ValueError):
+        return 0.0
 
 
-def transcribe_large_file(client: OpenAI, video_file: Path) -> str:
-    """Transcribe a large video file by splitting it into chunks."""
+async def whisper_transcribe(client: AsyncOpenAI, audio_path: Path, semaphore: asyncio.Semaphore) -> str:
+    """Upload one file to Whisper, holding a semaphore slot for the duration.
+    Retries 429/5xx with capped exponential backoff and jitter; other errors propagate.
+    """
+    for attempt in range(WHISPER_MAX_RETRIES + 1):
+        try:
+            async with semaphore:
+                # Read off the event loop so other uploads keep streaming meanwhile
+                audio_bytes = await asyncio.to_thread(audio_path.read_bytes)
+                transcript = await client.audio.transcriptions.create(
+                    model="whisper-1",
+                    file=(audio_path.name, audio_bytes),
+                    response_format="text"
+                )
+            return transcript.strip()
+        except Exception as e:
+            if attempt == WHISPER_MAX_RETRIES or not is_retryable(e):
+                raise
+            delay = min(WHISPER_BACKOFF_CAP, WHISPER_BACKOFF_BASE * (2 ** attempt))
+            delay += random.uniform(0, WHISPER_BACKOFF_BASE)
+            delay = max(delay, retry_after_seconds(e))
+            logger.warning(f"      ⚠️  {audio_path.name}: {e} - retrying in {delay:.1f}s ({attempt + 1}/{WHISPER_MAX_RETRIES})")
+            # Sleep without holding a slot so other uploads can proceed
+            await asyncio.sleep(delay)
+
+
+async def transcribe_large_file(client: AsyncOpenAI, video_file: Path, transcript_path: Path,
+                                semaphore: asyncio.Semaphore, checkpoint_db: sqlite3.Connection):
+    """Transcribe a large video file by splitting it into chunks, saving the result to transcript_path.
+    Chunks transcribed by an earlier, interrupted run are read from checkpoint_db instead of re-uploaded.
+    """
     if not check_ffmpeg():
         raise ValueError(
             "ffmpeg is not installed. Please install ffmpeg to process large files.\n"
@@ -185,181 +362,282 @@ def transcribe_large_file(client: OpenAI, video_file: Path) -> str:
     
     # Create temporary directory for chunks
     temp_dir = Path(tempfile.mkdtemp(prefix='video_chunks_'))
-    all_transcripts = []
+    # The transcript is built here and only renamed into place once complete
+    partial_path = transcript_path.with_name(transcript_path.name + '.tmp')
+    partial = None
+    wrote_any = False
     
     try:
-        # Split video into chunks
-        chunks = split_video_into_chunks(video_file, temp_dir)
+        # Extract the audio track first - usually small enough to skip splitting
+        audio_file = temp_dir / 'audio.ogg'
+        logger.info("    Extracting audio...")
+        await run_ffmpeg('-i', str(video_file), *AUDIO_ENCODE_ARGS, '-b:a', AUDIO_BITRATE, str(audio_file))
         
-        if not chunks:
-            raise ValueError("Failed to create video chunks")
+        audio_size = audio_file.stat().st_size
+        if audio_size <= MAX_FILE_SIZE:
+            logger.info(f"    Uploading audio ({size_mb(audio_size):.2f}MB)...")
+            transcript = await whisper_transcribe(client, audio_file, semaphore)
+            partial_path.write_text(transcript, encoding='utf-8')
+            os.replace(partial_path, transcript_path)
+            return
         
-        # Transcribe each chunk
-        print(f"    Transcribing {len(chunks)} chunks...")
-        for i, chunk in enumerate(chunks, 1):
-            chunk_size_mb = file_size_mb(chunk)
-            print(f"      Chunk {i}/{len(chunks)} ({chunk_size_mb:.2f}MB)...", end='', flush=True)
-            
+        # Pipeline: ffmpeg cuts the next chunk while earlier ones upload. The
+        # bounded queue keeps ffmpeg from running far ahead of the uploads.
+        queue: asyncio.Queue = asyncio.Queue(maxsize=MAX_CONCURRENT_UPLOADS)
+        
+        # Chunks are appended in chunk order as they settle, so progress is on disk throughout
+        partial = open(partial_path, 'w', encoding='utf-8')
+        settled: Dict[int, Optional[str]] = {}  # Chunk index -> text (None if it failed), waiting on an earlier chunk
+        failed_chunks: List[int] = []
+        next_index = 1
+        
+        def write_chunk(transcript: Optional[str]):
+            nonlocal wrote_any
+            if transcript is None:
+                return
+            if wrote_any:
+                partial.write("\n\n")
+            partial.write(transcript)
+            wrote_any = True
+        
+        def settle(i: int, transcript: Optional[str]):
+            """Record chunk i and append every chunk that is now next in order."""
+            nonlocal next_index
+            settled[i] = transcript
+            while next_index in settled:
+                write_chunk(settled.pop(next_index))
+                next_index += 1
+            partial.flush()
+            os.fsync(partial.fileno())
+        
+        video_key = video_checkpoint_key(video_file)
+        done_chunks = dict(checkpoint_db.execute(
+            'SELECT chunk_index, transcript FROM chunks WHERE video_key = ?', (video_key,)
+        ))
+        if done_chunks:
+            logger.info(f"    Resuming: {len(done_chunks)} chunks already transcribed")
+        
+        async def produce() -> int:
+            chunk_count = 0
             try:
-                with open(chunk, 'rb') as audio_file:
-                    transcript = client.audio.transcriptions.create(
-                        model="whisper-1",
-                        file=audio_file,
-                        response_format="text"
-                    )
-                all_transcripts.append(transcript.strip())
-                print(" ✓")
-            except Exception as e:
-                print(f" ✗ Error: {e}")
-                # Continue with other chunks even if one fails
-                continue
+                # Close the generator here, even if cancelled mid-put, so ffmpeg and
+                # re-encodes are stopped before temp_dir is removed - not later by GC
+                async with contextlib.aclosing(split_video_into_chunks(audio_file, temp_dir)) as chunks:
+                    async for index, chunk in chunks:
+                        chunk_count += 1
+                        await queue.put((index, chunk))
+            finally:
+                # One stop marker per consumer - unless we are being cancelled: the
+                # consumers are then cancelled too, and a full queue would never drain
+                if not asyncio.current_task().cancelling():
+                    for _ in range(MAX_CONCURRENT_UPLOADS):
+                        await queue.put(None)
+            return chunk_count
+        
+        async def consume():
+            while (item := await queue.get()) is not None:
+                i, chunk = item
+                chunk_size_mb = file_size_mb(chunk) if chunk is not None else 0.0
+                try:
+                    if i in done_chunks:
+                        transcript = done_chunks[i]
+                        status = "✓ (from checkpoint)"
+                    elif chunk is None:
+                        raise RuntimeError("no usable audio (empty segment or failed re-encode)")
+                    else:
+                        transcript = await whisper_transcribe(client, chunk, semaphore)
+                        checkpoint_db.execute(
+                            'INSERT OR REPLACE INTO chunks VALUES (?, ?, ?)', (video_key, i, transcript)
+                        )
+                        checkpoint_db.commit()
+                        status = "✓"
+                    settle(i, transcript)
+                    logger.info(f"      Chunk {i} ({chunk_size_mb:.2f}MB) {status}")
+                except Exception as e:
+                    # Continue with other chunks even if one fails
+                    logger.error(f"      Chunk {i} ✗ Error: {e}")
+                    failed_chunks.append(i)
+                    settle(i, None)
+                finally:
+                    # Free disk as soon as the chunk has been sent
+                    if chunk is not None:
+                        chunk.unlink()
+        
+        logger.info(f"    Transcribing chunks as they are cut ({MAX_CONCURRENT_UPLOADS} at a time)...")
+        # Let every task finish before re-raising, so none is still using temp_dir
+        results = await asyncio.gather(
+            produce(), *[consume() for _ in range(MAX_CONCURRENT_UPLOADS)],
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        chunk_count = results[0]
+        
+        if not chunk_count:
+            raise ValueError("Failed to create video chunks")
+        
+        # Chunks still held back - only possible if the split stopped early and left a gap
+        for i in sorted(settled):
+            write_chunk(settled[i])
+        partial.close()
+        
+        if failed_chunks:
+            # Leave the .txt.tmp and checkpoints in place: with no .txt, the next
+            # run picks this file up again and uploads only the missing chunks
+            raise RuntimeError(
+                f"{len(failed_chunks)} chunk(s) failed: {sorted(failed_chunks)} - "
+                f"rerun to retry them (partial transcript: {partial_path.name})"
+            )
+        
+        os.replace(partial_path, transcript_path)
         
-        # Combine all transcripts
-        combined_transcript = "\n\n".join(all_transcripts)
-        return combined_transcript
+        # The file is done - its chunk checkpoints are no longer needed
+        checkpoint_db.execute('DELETE FROM chunks WHERE video_key = ?', (video_key,))
+        checkpoint_db.commit()
         
     finally:
+        if partial is not None:
+            partial.close()
+        # Keep a partial transcript for inspection, but not an empty one
+        if not wrote_any and partial_path.exists():
+            partial_path.unlink()
         # Clean up temporary directory
         if temp_dir.exists():
             shutil.rmtree(temp_dir)
 
 
-def transcribe_file(client: OpenAI, video_file: Path) -> str:
-    """Transcribe a video/audio file using OpenAI Whisper API."""
-    file_size = video_file.stat().st_size
-    
+async def transcribe_file(client: AsyncOpenAI, video_file: Path, file_size: int, semaphore: asyncio.Semaphore) -> str:
+    """Transcribe a video/audio file using OpenAI Whisper API.
+    file_size is the size main() already read during triage.
+    """
     if file_size > MAX_FILE_SIZE:
-        raise ValueError(f"File size ({file_size_mb(video_file):.2f}MB) exceeds maximum ({MAX_FILE_SIZE / (1024*1024):.2f}MB)")
-    
-    print(f"    Uploading file ({file_size_mb(video_file):.2f}MB)...", end='', flush=True)
-    
-    try:
-        with open(video_file, 'rb') as audio_file:
-            transcript = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                response_format="text"
-            )
-        print(" ✓")
-        return transcript.strip()
+        raise ValueError(f"File size ({size_mb(file_size):.2f}MB) exceeds maximum ({size_mb(MAX_FILE_SIZE):.2f}MB)")
     
-    except Exception as e:
-        print(f" ✗")
-        raise e
+    return await whisper_transcribe(client, video_file, semaphore)
 
 
-def main():
+async def main():
     """Main function to transcribe all videos."""
-    print("Video Transcription Script (OpenAI Whisper API)")
-    print("=" * 60)
+    logger.info("Video Transcription Script (OpenAI Whisper API)")
+    logger.info("=" * 60)
     
     # Ensure transcript directory exists
     TRANSCRIPT_DIR.mkdir(parents=True, exist_ok=True)
     
     # Initialize OpenAI client
-    print("\n[1/3] Initializing OpenAI client...")
+    logger.info("\n[1/3] Initializing OpenAI client...")
     try:
         client = get_openai_client()
-        print("✓ Client initialized")
+        logger.info("✓ Client initialized")
     except Exception as e:
-        print(f"✗ Failed to initialize client: {e}")
+        logger.error(f"✗ Failed to initialize client: {e}")
         sys.exit(1)
     
     # Get video files
-    print(f"\n[2/3] Scanning {VIDEO_DIR} for video/audio files (recursively)...")
+    logger.info(f"\n[2/3] Scanning {VIDEO_DIR} for video/audio files (recursively)...")
     video_files = get_video_files()
     
     if not video_files:
-        print("  No video/audio files found!")
+        logger.info("  No video/audio files found!")
         sys.exit(0)
     
-    print(f"✓ Found {len(video_files)} video/audio files")
+    logger.info(f"✓ Found {len(video_files)} video/audio files")
     
-    # Filter files that need transcription
+    # Filter files that need transcription, keeping (file, size) so each file is stat'd once
     files_to_transcribe = []
     large_files_to_transcribe = []
     already_transcribed = []
     
-    for video_file in video_files:
-        transcript_path = get_transcript_path(video_file)
-        
-        if transcript_path.exists():
+    with ThreadPoolExecutor(max_workers=TRIAGE_WORKERS) as executor:
+        file_sizes = list(executor.map(triage_file, video_files))
+    
+    for video_file, file_size in zip(video_files, file_sizes):
+        if file_size is None:
             already_transcribed.append(video_file)
-        elif video_file.stat().st_size > MAX_FILE_SIZE:
-            large_files_to_transcribe.append(video_file)
+        elif file_size > MAX_FILE_SIZE:
+            large_files_to_transcribe.append((video_file, file_size))
         else:
-            files_to_transcribe.append(video_file)
+            files_to_transcribe.append((video_file, file_size))
     
-    print(f"\n  Files to transcribe: {len(files_to_transcribe)}")
-    print(f"  Large files to transcribe (will be split): {len(large_files_to_transcribe)}")
-    print(f"  Already transcribed: {len(already_transcribed)}")
+    logger.info(f"\n  Files to transcribe: {len(files_to_transcribe)}")
+    logger.info(f"  Large files to transcribe (audio extracted, split if still over 25MB): {len(large_files_to_transcribe)}")
+    logger.info(f"  Already transcribed: {len(already_transcribed)}")
     
     if not files_to_transcribe and not large_files_to_transcribe:
-        print("\n✓ All files already transcribed!")
+        logger.info("\n✓ All files already transcribed!")
         return
     
     # Transcribe regular-sized files
     successful = 0
     failed = 0
+    # Shared by both phases - caps Whisper uploads in flight, not files
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_UPLOADS)
     
     if files_to_transcribe:
-        print(f"\n[3/4] Transcribing {len(files_to_transcribe)} regular-sized files...")
-        for i, video_file in enumerate(files_to_transcribe, 1):
+        logger.info(f"\n[3/4] Transcribing {len(files_to_transcribe)} regular-sized files ({MAX_CONCURRENT_UPLOADS} at a time)...")
+        
+        async def transcribe_and_save(i: int, video_file: Path, file_size: int) -> bool:
             transcript_path = get_transcript_path(video_file)
-            
-            print(f"\n  [{i}/{len(files_to_transcribe)}] {video_file.name}")
+            label = f"  [{i}/{len(files_to_transcribe)}] {video_file.name}"
             
             try:
-                transcript_text = transcribe_file(client, video_file)
+                transcript_text = await transcribe_file(client, video_file, file_size, semaphore)
                 
                 # Save transcript to file
                 with open(transcript_path, 'w', encoding='utf-8') as f:
                     f.write(transcript_text)
                 
-                print(f"    Saved transcript: {transcript_path.name}")
-                successful += 1
+                logger.info(f"{label} ✓ Saved transcript: {transcript_path.name}")
+                return True
                 
             except ValueError as e:
-                print(f"    ✗ Skipped: {e}")
-                failed += 1
+                logger.warning(f"{label} ✗ Skipped: {e}")
+                return False
             except Exception as e:
-                print(f"    ✗ Error: {e}")
-                failed += 1
+                logger.error(f"{label} ✗ Error: {e}")
+                return False
+        
+        results = await asyncio.gather(
+            *[transcribe_and_save(i, video_file, file_size)
+              for i, (video_file, file_size) in enumerate(files_to_transcribe, 1)]
+        )
+        successful += sum(results)
+        failed += len(results) - sum(results)
     
     # Transcribe large files (with splitting)
     if large_files_to_transcribe:
-        print(f"\n[4/4] Transcribing {len(large_files_to_transcribe)} large files (splitting into chunks)...")
-        for i, video_file in enumerate(large_files_to_transcribe, 1):
+        checkpoint_db = open_checkpoint_db()
+        logger.info(f"\n[4/4] Transcribing {len(large_files_to_transcribe)} large files (extracting audio, splitting if needed)...")
+        for i, (video_file, file_size) in enumerate(large_files_to_transcribe, 1):
             transcript_path = get_transcript_path(video_file)
             
-            print(f"\n  [{i}/{len(large_files_to_transcribe)}] {video_file.name} ({file_size_mb(video_file):.2f}MB)")
+            logger.info(f"\n  [{i}/{len(large_files_to_transcribe)}] {video_file.name} ({size_mb(file_size):.2f}MB)")
             
             try:
-                transcript_text = transcribe_large_file(client, video_file)
-                
-                # Save transcript to file
-                with open(transcript_path, 'w', encoding='utf-8') as f:
-                    f.write(transcript_text)
-                
-                print(f"    Saved transcript: {transcript_path.name}")
+                await transcribe_large_file(client, video_file, transcript_path, semaphore, checkpoint_db)
+                logger.info(f"    Saved transcript: {transcript_path.name}")
                 successful += 1
                 
             except ValueError as e:
-                print(f"    ✗ Skipped: {e}")
+                logger.warning(f"    ✗ Skipped: {e}")
                 failed += 1
             except Exception as e:
-                print(f"    ✗ Error: {e}")
+                logger.error(f"    ✗ Error: {e}")
                 failed += 1
+        
+        checkpoint_db.close()
     
     # Summary
-    print("\n" + "=" * 60)
-    print("Transcription Summary:")
-    print(f"  Successful: {successful}")
-    print(f"  Failed: {failed}")
-    print(f"  Already transcribed: {len(already_transcribed)}")
-    print("=" * 60)
+    logger.info("\n" + "=" * 60)
+    logger.info("Transcription Summary:")
+    logger.info(f"  Successful: {successful}")
+    logger.info(f"  Failed: {failed}")
+    logger.info(f"  Already transcribed: {len(already_transcribed)}")
+    logger.info("=" * 60)
 
 
 if __name__ == '__main__':
-    main()
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
+    asyncio.run(main())
 
@@ -4,12 +4,12 @@ Undo PDF chunk organization - move files back from PDF subfolders to parent dire
 """
 
 import os
-import shutil
 from pathlib import Path
 
 SOURCE_DIR = Path('/Users/justinlin/Documents/10K2KChatBot/10K2Kv2')
 
 stats = {
+    'pdf_folders': 0,
     'files_found': 0,
     'files_moved': 0,
     'folders_removed': 0,
@@ -25,63 +25,54 @@ def undo_organization():
     print(f"Source directory: {SOURCE_DIR}")
     print()
     
-    # Find all PDF subfolders
-    print("Searching for PDF subfolders...")
-    pdf_folders = []
-    
-    for pdf_folder in SOURCE_DIR.rglob("PDF"):
-        if pdf_folder.is_dir():
-            pdf_folders.append(pdf_folder)
-    
-    if not pdf_folders:
-        print("✗ No PDF subfolders found!")
-        return
-    
-    print(f"✓ Found {len(pdf_folders)} PDF subfolder(s)")
+    # Single walk: each PDF subfolder is handled as it is reached, listing it only once
+    print("Moving files from PDF subfolders back to parent directories...")
     print()
     
-    # Move files back to parent directories
-    print("Moving files back to parent directories...")
-    print()
-    
-    for pdf_folder in sorted(pdf_folders):
-        parent_dir = pdf_folder.parent
+    for root, dirs, files in os.walk(SOURCE_DIR):
+        dirs.sort()
+        if os.path.basename(root) != 'PDF':
+            continue
         
-        # Get all files in PDF folder
-        files_in_pdf = list(pdf_folder.glob("*"))
-        txt_files = [f for f in files_in_pdf if f.is_file() and f.suffix == '.txt']
+        stats['pdf_folders'] += 1
+        parent_dir = os.path.dirname(root)
+        txt_files = sorted(name for name in files if name.endswith('.txt'))
+        # Anything left behind (subfolders, other files, skipped .txt) keeps the folder
+        remaining = len(dirs) + len(files) - len(txt_files)
         
         if not txt_files:
-            print(f"No files in {pdf_folder}")
+            print(f"No files in {root}")
             continue
         
-        print(f"Processing: {pdf_folder}")
+        print(f"Processing: {root}")
         print(f"  Parent: {parent_dir}")
         print(f"  Files found: {len(txt_files)}")
         
         # Move each file back to parent
-        for txt_file in sorted(txt_files):
+        for name in txt_files:
             try:
-                dest_path = parent_dir / txt_file.name
+                dest_path = os.path.join(parent_dir, name)
                 # Check if file already exists in parent
-                if dest_path.exists():
-                    print(f"    ⚠ Skipping {txt_file.name} (already exists in parent)")
+                if os.path.exists(dest_path):
+                    print(f"    ⚠ Skipping {name} (already exists in parent)")
                     stats['errors'] += 1
+                    remaining += 1
                     continue
                 
-                shutil.move(str(txt_file), str(dest_path))
-                print(f"    ✓ Moved: {txt_file.name}")
+                # Same filesystem, so a rename rather than a copy
+                os.rename(os.path.join(root, name), dest_path)
+                print(f"    ✓ Moved: {name}")
                 stats['files_moved'] += 1
                 stats['files_found'] += 1
             except Exception as e:
-                print(f"    ✗ Error moving {txt_file.name}: {e}")
+                print(f"    ✗ Error moving {name}: {e}")
                 stats['errors'] += 1
+                remaining += 1
         
         # Remove PDF folder if empty
         try:
-            remaining_files = list(pdf_folder.glob("*"))
-            if not remaining_files:
-                pdf_folder.rmdir()
+            if not remaining:
+                os.rmdir(root)
                 print(f"  ✓ Removed empty PDF folder")
                 stats['folders_removed'] += 1
             else:
@@ -91,10 +82,15 @@ def undo_organization():
         
         print()
     
+    if not stats['pdf_folders']:
+        print("✗ No PDF subfolders found!")
+        return
+    
     # Print summary
     print("=" * 70)
     print("UNDO SUMMARY")
     print("=" * 70)
+    print(f"PDF subfolders found: {stats['pdf_folders']}")
     print(f"Files found: {stats['files_found']}")
     print(f"Files moved: {stats['files_moved']}")
     print(f"PDF folders removed: {stats['folders_removed']}")